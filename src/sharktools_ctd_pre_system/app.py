@@ -5,7 +5,11 @@ import tkinter as tk
 import shark_tkinter_lib.tkinter_widgets as tkw
 
 from sharktools import core
+from sharktools_ctd_pre_system import events
 from sharktools_ctd_pre_system import gui
+from sharktools_ctd_pre_system import options
+from sharktools_ctd_pre_system import plugins
+from sharktools_ctd_pre_system import saves
 from sharktools.plugin import PluginApp
 
 ALL_PAGES = dict()
@@ -59,6 +63,11 @@ class App(PluginApp):
 
         self.latest_loaded_sampling_type = ''
 
+        events.start_pump(self)
+        options.get_options_registry().watch(self)
+        if os.environ.get(events.JOURNAL_ENV_VARIABLE):
+            events.start_journal(os.environ[events.JOURNAL_ENV_VARIABLE])
+
         self._set_frame()
 
         self.startup_pages()
@@ -73,6 +82,14 @@ class App(PluginApp):
                     frame.close()
                 except:
                     pass
+        saves.flush_all()
+        events.stop_pump()
+        options.get_options_registry().stop_watch()
+        plugins.stop_polling()
+        events.stop_journal()
+        if events.is_profiling():
+            self.logger.info(f'Event handler profile:\n{events.get_profile_report()}')
+            self.logger.info(f'Event cascades:\n{events.get_cascade_report()}')
 
     def update_page(self):
         self.update_all()
@@ -0,0 +1,439 @@
+"""
+Benchmarks of the pre-system.
+
+    python -m sharktools_ctd_pre_system.benchmark [--repeat 1000]
+    python -m sharktools_ctd_pre_system.benchmark --platform [--scenario <scenario.yaml>] [--presses 10]
+    python -m sharktools_ctd_pre_system.benchmark --subscribe [--repeat 1000]
+    python -m sharktools_ctd_pre_system.benchmark --dispatch [--repeat 200000]
+    python -m sharktools_ctd_pre_system.benchmark --session [--changes 200] [--change-interval 0.01]
+
+save_components (no display needed): saves and loads a full station form (station, admin and conditions components)
+with SaveComponents and compares it with storing str(value) as done before the typed records.
+
+platform_responsiveness: builds the station frames (as in replay) with the fake platform_info plugin driven by a
+scenario file, presses the platform button a number of times and measures how late the Tk main loop runs a callback
+scheduled every TICK_INTERVAL ms. Run for the modes "sync" (fetch on the Tk thread), "async" (background fetch) and
+"cached" (background poller and TTL cache). The poller only runs in "cached".
+
+subscribe (no display needed): time to subscribe one handler when 0, 1 000 and 10 000 handlers are already subscribed
+to the event, compared with the scan over all subscribers (str(func).split()[2]) done before subscribers were keyed.
+
+dispatch (no display needed): time to post an event to three subscribed bound methods with the compiled dispatch
+tables (events.post_event), compared with the loop over the three phase dicts done before the tables.
+
+session (no display needed): edits the station form <changes> times, <change_interval> seconds apart, closes the
+session (flush) and counts the writes to file. Run for Saves writing every change (write_delay=0), Saves writing
+behind (SESSION_WRITE_DELAY, scaled down together with the change interval) and SqliteSaves.
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import tempfile
+import time
+
+from sharktools_ctd_pre_system import events
+from sharktools_ctd_pre_system import fake_platform_info
+from sharktools_ctd_pre_system import plugins
+from sharktools_ctd_pre_system import saves
+
+# Milliseconds between the callbacks used to measure the responsiveness of the Tk main loop
+TICK_INTERVAL = 10
+
+PLATFORM_MODES = ['sync', 'async', 'cached']
+
+# Number of handlers already subscribed when the subscribe cost is measured
+SUBSCRIBER_COUNTS = [0, 1000, 10000]
+
+BENCHMARK_EVENT_TYPE = 'select_instrument'
+
+# Number of bound methods subscribed when the dispatch is measured
+NR_DISPATCH_HANDLERS = 3
+
+# Write delay (seconds) of Saves in the session benchmark. Scaled down from saves.WRITE_DELAY as are the seconds
+# between changes.
+SESSION_WRITE_DELAY = .1
+
+
+class _BenchComponent:
+    """
+    Stands in for a component in gui.components. Only _id, get and set are used by SaveComponents.
+    """
+
+    def __init__(self, id, value):
+        self._id = id
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, item):
+        self.value = item
+
+
+def _component_type(name):
+    # The codec is chosen by class name, so the stand-ins are named as the real components
+    return type(name, (_BenchComponent,), {})
+
+
+STATION_FORM = [
+    ('CruiseLabelDoubleEntry', 'cruise', ('04', '2024')),
+    ('VesselLabelDoubleEntry', 'vessel', ('Svea', '77SE')),
+    ('SeriesEntryPicker', 'series', '0123'),
+    ('LabelCheckbox', 'tail', 1),
+    ('LabelDropdownList', 'station', 'BY5 BORNHOLMSDJ'),
+    ('LabelEntry', 'distance', '120'),
+    ('DepthEntry', 'depth', '85'),
+    ('LabelEntry', 'bin_size', '1'),
+    ('LabelDropdownList', 'operator', 'XX'),
+    ('LabelEntry', 'event_id', 'ae8b0a5c-6a57-4d4b-9c63-4f1b3a1f3f6e'),
+    ('LabelDropdownList', 'mprog', 'NATL'),
+    ('LabelDropdownList', 'proj', 'BAS'),
+    ('LabelDropdownList', 'orderer', 'HAV, SMHI'),
+    ('LabelDropdownList', 'slabo', 'SMHI'),
+    ('LabelDropdownList', 'alabo', 'SMHI'),
+    ('LabelEntry', 'refsk', 'HC-B-B8, HC-C-C2, OM7'),
+    ('IntEntry', 'wadep', '86'),
+    ('FloatEntry', 'winsp', '7.5'),
+    ('LabelDropdownList', 'windir', '27'),
+    ('FloatEntry', 'airpres', '1012.3'),
+    ('FloatEntry', 'airtemp', '14.2'),
+    ('LabelDropdownList', 'weath', '2'),
+    ('LabelDropdownList', 'cloud', '6'),
+    ('LabelDropdownList', 'waves', '3'),
+    ('LabelDropdownList', 'iceob', '0'),
+]
+
+
+def create_station_form():
+    return [_component_type(type_name)(id, value) for type_name, id, value in STATION_FORM]
+
+
+def benchmark_save_components(repeat=1000):
+    """
+    Saves (one changed value per round) and loads the station form <repeat> times. Changes are written behind, so
+    the times are the cost of encoding and decoding, not of file access.
+    :return: dict with save_time and load_time per round (seconds) and the size of the stored json (bytes),
+    for the typed records ("typed") and for str(value) ("str").
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        saves._saves = saves.Saves(file_path=pathlib.Path(directory, 'bench.json'))
+        try:
+            comps = create_station_form()
+            store = saves.SaveComponents('BenchmarkStationForm')
+            store.add_components(*comps)
+
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                comps[2].value = str(i).zfill(4)
+                store.save()
+            save_time = (time.perf_counter() - t0) / repeat
+
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                store.load()
+            load_time = (time.perf_counter() - t0) / repeat
+            stored = saves.get_saves().get('BenchmarkStationForm')
+            result['typed'] = dict(save_time=save_time, load_time=load_time,
+                                   size=len(json.dumps(stored, separators=(',', ':'))))
+
+            # Stored as str(value) and parsed back by the setters
+            data = {}
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                comps[2].value = str(i).zfill(4)
+                data = {comp._id: str(comp.get()) for comp in comps}
+                saves.get_saves().set('BenchmarkStationFormStr', data)
+            save_time = (time.perf_counter() - t0) / repeat
+
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                stored = saves.get_saves().get('BenchmarkStationFormStr')
+                defaults = saves.get_defaults()
+                for comp in comps:
+                    comp.set(defaults.get(comp._id) or stored[comp._id])
+            load_time = (time.perf_counter() - t0) / repeat
+            result['str'] = dict(save_time=save_time, load_time=load_time,
+                                 size=len(json.dumps(data, separators=(',', ':'))))
+        finally:
+            saves.get_saves().flush()
+            saves._saves = None
+    return result
+
+
+def _create_owner(i):
+    # One class per owner so that the methods are separate subscribers, also for the scan by name
+    def on_event(self, data, **kwargs):
+        pass
+    on_event.__qualname__ = f'_BenchOwner{i}.on_event'
+    return type(f'_BenchOwner{i}', (), {'on_event': on_event})()
+
+
+def _subscribe_scanning(table, func):
+    # Subscribe as done before subscribers were keyed: every subscriber is compared by name
+    func_part = str(func).split()[2]
+    for f in list(table):
+        if func_part == str(f).split()[2]:
+            table.remove(f)
+    table.add(func)
+
+
+def benchmark_subscribe(repeat=1000, subscriber_counts=SUBSCRIBER_COUNTS):
+    """
+    Subscribes (and unsubscribes) a bound method <repeat> times with <nr> bound methods of other owners subscribed
+    to the same event, for every nr in subscriber_counts. The scan is done on a table rebuilt for every round.
+    :return: dict nr -> dict with keyed and scanning time per subscribe (seconds)
+    """
+    result = {}
+    for nr in subscriber_counts:
+        owners = [_create_owner(i) for i in range(nr)]
+        owner = _create_owner(nr)
+        for other in owners:
+            events.subscribe(BENCHMARK_EVENT_TYPE, other.on_event)
+        try:
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                events.subscribe(BENCHMARK_EVENT_TYPE, owner.on_event)
+                events.unsubscribe(BENCHMARK_EVENT_TYPE, owner.on_event)
+            keyed_time = (time.perf_counter() - t0) / repeat
+        finally:
+            for other in owners:
+                events.unsubscribe(BENCHMARK_EVENT_TYPE, other.on_event)
+
+        # The scan is slow for large nr, so fewer rounds
+        scan_repeat = max(1, repeat // max(1, nr // 100))
+        scanning_time = 0.
+        for i in range(scan_repeat):
+            table = {other.on_event for other in owners}
+            t0 = time.perf_counter()
+            _subscribe_scanning(table, owner.on_event)
+            scanning_time += time.perf_counter() - t0
+        result[nr] = dict(keyed_time=keyed_time, scanning_time=scanning_time / scan_repeat)
+    return result
+
+
+# Subscribers as held before the compiled tables: event_type -> set of functions (bound methods held strongly)
+_phase_subscribers_before = dict()
+_phase_subscribers = dict()
+_phase_subscribers_after = dict()
+
+
+def _post_event_by_phase(event_type, data, **kwargs):
+    # Dispatch as done before the compiled tables
+    for sub in [_phase_subscribers_before, _phase_subscribers, _phase_subscribers_after]:
+        if event_type not in sub:
+            continue
+        for func in sub[event_type]:
+            func(data, **kwargs)
+
+
+def _time_posts(post, nr_posts):
+    t0 = time.perf_counter()
+    for i in range(nr_posts):
+        post(BENCHMARK_EVENT_TYPE, i)
+    return (time.perf_counter() - t0) / nr_posts
+
+
+def benchmark_dispatch(repeat=200000, nr_handlers=NR_DISPATCH_HANDLERS, rounds=20):
+    """
+    Posts an event <repeat> times to <nr_handlers> subscribed bound methods. The posts are split into <rounds>
+    rounds that alternate between the two dispatchers, and the fastest round of each is used (as timeit does) so
+    that other load on the machine affects both alike.
+    :return: dict with compiled and by_phase time per post (seconds)
+    """
+    owners = [_create_owner(i) for i in range(nr_handlers)]
+    for owner in owners:
+        events.subscribe(BENCHMARK_EVENT_TYPE, owner.on_event)
+    _phase_subscribers[BENCHMARK_EVENT_TYPE] = {owner.on_event for owner in owners}
+    compiled_times = []
+    by_phase_times = []
+    try:
+        events.post_event(BENCHMARK_EVENT_TYPE, None)
+        for i in range(rounds):
+            compiled_times.append(_time_posts(events.post_event, max(1, repeat // rounds)))
+            by_phase_times.append(_time_posts(_post_event_by_phase, max(1, repeat // rounds)))
+    finally:
+        _phase_subscribers.clear()
+        for owner in owners:
+            events.unsubscribe(BENCHMARK_EVENT_TYPE, owner.on_event)
+    return dict(compiled_time=min(compiled_times), by_phase_time=min(by_phase_times))
+
+
+def _run_session(store, nr_changes, change_interval):
+    comps = create_station_form()
+    store.set('BenchmarkSession', {comp._id: comp.get() for comp in comps})
+    for i in range(nr_changes):
+        comp = comps[i % len(comps)]
+        store.update('BenchmarkSession', {comp._id: f'{comp.get()}{i}'})
+        time.sleep(change_interval)
+    store.flush()
+    return store.nr_writes
+
+
+def benchmark_session_writes(nr_changes=200, change_interval=.01, write_delay=SESSION_WRITE_DELAY):
+    """
+    Runs the same editing session against each store and closes it.
+    :return: dict store name -> number of writes to file
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        stores = dict(
+            direct=saves.Saves(write_delay=0, file_path=pathlib.Path(directory, 'direct.json')),
+            write_behind=saves.Saves(write_delay=write_delay, file_path=pathlib.Path(directory, 'behind.json')),
+            sqlite=saves.SqliteSaves(file_path=pathlib.Path(directory, 'session.sqlite')),
+        )
+        try:
+            for name, store in stores.items():
+                result[name] = _run_session(store, nr_changes, change_interval)
+        finally:
+            stores['sqlite']._connection.close()
+    return result
+
+
+def benchmark_platform_responsiveness(scenario_path=fake_platform_info.EXAMPLE_SCENARIO_PATH, mode='async',
+                                      nr_presses=10, press_interval=2.):
+    """
+    Presses the platform button <nr_presses> times, <press_interval> seconds apart, with the fake platform plugin
+    following the scenario. Needs a display.
+    :return: dict with lag_max, lag_p95 and lag_mean (seconds the Tk main loop was late), apply_time_mean (seconds
+    from press to applied data), nr_applied, nr_errors and nr_polls (refreshes made by the poller)
+    """
+    from sharktools_ctd_pre_system.replay import StubController
+    from sharktools_ctd_pre_system.replay import build_station_frames
+
+    fake_platform_info.load_scenario(scenario_path)
+    plugins.set_platform_info(fake_platform_info)
+    cache = plugins.get_platform_data_cache()
+    ttl = cache.ttl
+    polling_enabled = plugins.is_polling_enabled()
+    nr_polls = cache.nr_polls
+    if mode != 'cached':
+        # Neither the frame nor the presses start the poller, and nothing is served from the cache
+        plugins.enable_polling(False)
+        cache.ttl = 0.
+
+    root, frame = build_station_frames(StubController())
+    station_frame = frame.content_frame
+    events.start_pump(root)
+
+    lags = []
+    press_times = []
+    apply_times = []
+    errors = []
+
+    def on_error(e):
+        # Instead of the error dialog
+        errors.append(e)
+        return True
+
+    def on_loaded(data):
+        if press_times:
+            apply_times.append(time.perf_counter() - press_times[-1])
+
+    def tick(expected):
+        now = time.perf_counter()
+        lags.append(max(0., now - expected))
+        root.after(TICK_INTERVAL, tick, now + TICK_INTERVAL / 1000)
+
+    def press():
+        press_times.append(time.perf_counter())
+        if mode == 'sync':
+            try:
+                data = plugins.get_current_platform_data()
+            except Exception as e:
+                on_error(e)
+                return
+            station_frame._on_platform_data(data)
+        else:
+            events.post_event('button_platform', None)
+
+    station_frame._show_platform_error = on_error
+    events.subscribe('load_platform_info', on_loaded)
+    try:
+        # Give the poller time to fill the cache
+        start_delay = 1000 if mode == 'cached' else 100
+        for i in range(nr_presses):
+            root.after(int(start_delay + i * press_interval * 1000), press)
+        root.after(TICK_INTERVAL, tick, time.perf_counter() + TICK_INTERVAL / 1000)
+        root.after(int(start_delay + nr_presses * press_interval * 1000), root.quit)
+        root.mainloop()
+    finally:
+        events.unsubscribe('load_platform_info', on_loaded)
+        plugins.stop_polling()
+        plugins.enable_polling(polling_enabled)
+        events.stop_pump()
+        cache.ttl = ttl
+        root.destroy()
+
+    lags.sort()
+    return dict(lag_max=lags[-1],
+                lag_p95=lags[int(len(lags) * .95)],
+                lag_mean=statistics.mean(lags),
+                apply_time_mean=statistics.mean(apply_times) if apply_times else None,
+                nr_applied=len(apply_times),
+                nr_errors=len(errors),
+                nr_polls=cache.nr_polls - nr_polls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of SHARKtools_pre_system_Svea')
+    parser.add_argument('--repeat', type=int, help='Number of rounds (default 1000, 200000 for --dispatch)')
+    parser.add_argument('--subscribe', action='store_true', help='Benchmark the cost of subscribe with many '
+                                                                 'subscribers')
+    parser.add_argument('--dispatch', action='store_true', help='Benchmark post_event')
+    parser.add_argument('--session', action='store_true', help='Count the writes to file in an editing session')
+    parser.add_argument('--changes', type=int, default=200, help='Number of changes in the session')
+    parser.add_argument('--change-interval', type=float, default=.01, help='Seconds between changes in the session')
+    parser.add_argument('--platform', action='store_true', help='Benchmark the responsiveness when loading '
+                                                                'platform info (needs a display)')
+    parser.add_argument('--scenario', default=str(fake_platform_info.EXAMPLE_SCENARIO_PATH),
+                        help='Scenario file for the fake platform_info plugin')
+    parser.add_argument('--presses', type=int, default=10, help='Number of presses on the platform button')
+    parser.add_argument('--press-interval', type=float, default=2., help='Seconds between presses')
+    args = parser.parse_args()
+
+    if args.subscribe:
+        print('Subscribe with other handlers subscribed to the same event:')
+        print(f'{"handlers":>9} {"keyed [us]":>11} {"scanning [us]":>14}')
+        for nr, info in benchmark_subscribe(args.repeat or 1000).items():
+            print(f'{nr:>9} {info["keyed_time"] * 1e6:>11.2f} {info["scanning_time"] * 1e6:>14.1f}')
+        return
+
+    if args.dispatch:
+        info = benchmark_dispatch(args.repeat or 200000)
+        print(f'Post an event to {NR_DISPATCH_HANDLERS} bound methods:')
+        print(f'{"compiled [us]":>14} {"by phase [us]":>14}')
+        print(f'{info["compiled_time"] * 1e6:>14.2f} {info["by_phase_time"] * 1e6:>14.2f}')
+        return
+
+    if args.session:
+        print(f'Writes to file in a session of {args.changes} changes, {args.change_interval:g} s apart '
+              f'(write behind after {SESSION_WRITE_DELAY:g} s):')
+        print(f'{"store":>13} {"writes":>7}')
+        for name, nr_writes in benchmark_session_writes(args.changes, args.change_interval).items():
+            print(f'{name:>13} {nr_writes:>7}')
+        return
+
+    if args.platform:
+        print(f'Responsiveness when loading platform info ({args.scenario}):')
+        print(f'{"mode":>6} {"lag max [ms]":>13} {"lag p95 [ms]":>13} {"lag mean [ms]":>14} {"apply [ms]":>11} '
+              f'{"applied":>8} {"errors":>7} {"polls":>6}')
+        for mode in PLATFORM_MODES:
+            info = benchmark_platform_responsiveness(args.scenario, mode=mode, nr_presses=args.presses,
+                                                     press_interval=args.press_interval)
+            apply_time = info['apply_time_mean']
+            apply_time = f'{apply_time * 1000:>11.1f}' if apply_time is not None else f'{"-":>11}'
+            print(f'{mode:>6} {info["lag_max"] * 1000:>13.1f} {info["lag_p95"] * 1000:>13.1f} '
+                  f'{info["lag_mean"] * 1000:>14.1f} {apply_time} {info["nr_applied"]:>8} {info["nr_errors"]:>7} '
+                  f'{info["nr_polls"]:>6}')
+        return
+
+    print('Save/load of a full station form with SaveComponents:')
+    print(f'{"":>6} {"save [us]":>10} {"load [us]":>10} {"size [B]":>9}')
+    for name, info in benchmark_save_components(args.repeat or 1000).items():
+        print(f'{name:>6} {info["save_time"] * 1e6:>10.1f} {info["load_time"] * 1e6:>10.1f} {info["size"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,85 @@
 
+import contextlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+import types
+import weakref
+
+logger = logging.getLogger(__file__)
+
 subscribers = dict()
 subscribers_before = dict()
 subscribers_after = dict()
 
+# Each of the dicts above maps event_type -> {subscriber key: _Subscriber}
+
+# Compiled dispatch tables: event_type -> (tuple of (_Subscriber, owner_ref, function) in call order (before, normal,
+# after), direct). direct is True if every subscriber is a method without debounce, which post_event then calls
+# without further checks. An entry is dropped whenever the subscriptions for the event type change and rebuilt on the
+# next post.
+_dispatch_tables = dict()
+
+# Profiling of post_event is opt-in. Turn on with enable_profiling() or by setting the environment variable below.
+PROFILING_ENV_VARIABLE = 'SHARKTOOLS_PROFILE_EVENTS'
+
+_profiling = bool(os.environ.get(PROFILING_ENV_VARIABLE))
+_profile = dict()
+
+# Event types currently being dispatched (outermost first). Its length is the nesting depth of post_event.
+_event_stack = []
+
+# Maximum nesting depth of post_event. Deeper nesting is taken as an endless event loop (EventCascadeError).
+MAX_EVENT_DEPTH = 25
+
+# Nesting depth from which post_event leaves the fast path: MAX_EVENT_DEPTH, or 0 while events are batched, recorded
+# or profiled, so that a single check on the hot path covers all of these (see _update_fast_dispatch_depth).
+_fast_dispatch_depth = 0 if _profiling else MAX_EVENT_DEPTH
+
+# Cascades (an event and all events posted by its handlers) are recorded when profiling
+_cascades = dict()
+_cascade_edges = dict()
+_current_cascade = []
+
+# Calls made from worker threads are queued here and run in the Tk thread by the pump (see start_pump)
+_main_loop_queue = queue.SimpleQueue()
+_pump_widget = None
+_pump_after_id = None
+_pump_interval = 50
+_main_thread_id = threading.main_thread().ident
+
+# Recording of posted events to a journal file (see start_journal) is opt-in. Turn on with start_journal() or by
+# setting the environment variable below to the path of the journal.
+JOURNAL_ENV_VARIABLE = 'SHARKTOOLS_EVENT_JOURNAL'
+
+_journal = None
+
+# Events posted inside a batch (see batch) are collected here and posted when the outermost batch ends
+_batch_depth = 0
+_batch_events = dict()
+
+# Pending debounced calls (see _Subscriber.schedule): owner widget -> {subscriber key: [after id, _Subscriber, data,
+# kwargs]}. Keyed on the function, not the event type, so that all event types feeding a handler share one timer.
+_debounced_calls = weakref.WeakKeyDictionary()
+
+# Stack of active SubscriptionScope (innermost last). Subscriptions are added to the innermost scope.
+_scopes = []
+
 
 class InvalidEventType(Exception):
     pass
 
 
+class EventCascadeError(Exception):
+    def __init__(self, event_path):
+        self.event_path = event_path
+        super().__init__(f'Events nested more than {MAX_EVENT_DEPTH} levels: {" -> ".join(event_path)}')
+
+
 class EventTypes:
     def __init__(self):
         self.event_types = [
@@ -52,44 +124,623 @@ class EventTypes:
         return False
 
 
-def _remove_existing(event_type, func):
-    func_part = str(func).split()[2]
-    for sub in [subscribers_before, subscribers, subscribers_after]:
-        for f in list(sub.get(event_type, [])):
-            if func_part == str(f).split()[2]:
-                # print('REMOVING:', func_part)
-                sub[event_type].remove(f)
+EVENT_TYPES = frozenset(EventTypes().event_types)
+
+
+def _subscriber_key(func):
+    """
+    Returns the key identifying a subscriber. Bound methods are identified by the underlying function so that
+    a method subscribed by a new instance (e.g. a rebuilt frame) replaces the one subscribed by the old instance.
+    :return:
+    """
+    return getattr(func, '__func__', func)
+
+
+class _Subscriber:
+    """
+    A subscription of a function to an event type. Bound methods are held through a weak reference so that a
+    subscription does not keep its owner (typically a frame) alive. The subscription is removed when the owner is
+    garbage collected.
+
+    If debounce (milliseconds) is given a burst of events results in one call to the function. Every event restarts
+    the timer and the function is called with the data of the latest event once no event has arrived for <debounce>
+    ms. The timer is shared by all event types the function is subscribed to, so a burst of different events also
+    results in one call. The call is scheduled on the Tk event loop via the widget that owns the function. If there
+    is no such widget the function is called directly.
+    """
+
+    def __init__(self, event_type, func, phase, debounce=None):
+        self.event_type = event_type
+        self.key = _subscriber_key(func)
+        self.name = getattr(func, '__qualname__', repr(func))
+        self.debounce = debounce
+        self._phase = phase
+        if hasattr(func, '__self__') and hasattr(func, '__func__'):
+            self.owner_ref = weakref.ref(func.__self__, self._on_owner_collected)
+            self.function = func.__func__
+        else:
+            self.owner_ref = None
+            self.function = func
+        self.active = True
+
+    def __repr__(self):
+        func = self.func
+        text = f'<dead> {self.name}' if func is None else str(func)
+        if self.debounce is not None:
+            text = f'{text} (debounce={self.debounce} ms)'
+        return text
+
+    @property
+    def func(self):
+        if self.owner_ref is None:
+            return self.function
+        owner = self.owner_ref()
+        if owner is None:
+            return None
+        return types.MethodType(self.function, owner)
+
+    def _on_owner_collected(self, ref):
+        self.discard()
+
+    def discard(self):
+        """
+        Removes the subscription (if it is still registered) and cancels any pending debounced call.
+        """
+        self.active = False
+        subs = self._phase.get(self.event_type)
+        if subs and subs.get(self.key) is self:
+            del subs[self.key]
+            _dispatch_tables.pop(self.event_type, None)
+        self.cancel()
+
+    def schedule(self, owner, data, kwargs):
+        widget = owner
+        if not hasattr(widget, 'after'):
+            _call(self, owner, data, kwargs)
+            return
+        calls = _debounced_calls.setdefault(widget, {})
+        call = calls.get(self.key)
+        if call is not None:
+            widget.after_cancel(call[0])
+        # The widget is referenced weakly by the scheduled call
+        if self.debounce:
+            after_id = widget.after(self.debounce, _run_debounced, self.owner_ref, self.key)
+        else:
+            after_id = widget.after_idle(_run_debounced, self.owner_ref, self.key)
+        calls[self.key] = [after_id, self, data, kwargs]
+
+    def cancel(self):
+        """
+        Cancels a pending debounced call scheduled by this subscription.
+        """
+        owner = self.owner_ref() if self.owner_ref is not None else None
+        if owner is None:
+            return
+        calls = _debounced_calls.get(owner)
+        if not calls or self.key not in calls or calls[self.key][1] is not self:
+            return
+        after_id = calls.pop(self.key)[0]
+        try:
+            owner.after_cancel(after_id)
+        except Exception:
+            pass
+
+
+def _run_debounced(owner_ref, key):
+    owner = owner_ref()
+    if owner is None:
+        return
+    call = _debounced_calls.get(owner, {}).pop(key, None)
+    if call is None:
+        return
+    after_id, sub, data, kwargs = call
+    _call(sub, owner, data, kwargs)
 
 
-def subscribe(event_type, func, before=False, after=False):
-    _remove_existing(event_type, func)
-    # print('ADDING event:', event_type)
-    if event_type not in EventTypes():
+def _remove_existing(event_type, key):
+    for phase in [subscribers_before, subscribers, subscribers_after]:
+        sub = phase.get(event_type, {}).get(key)
+        if sub is not None:
+            sub.discard()
+
+
+def subscribe(event_type, func, before=False, after=False, debounce=None):
+    """
+    Subscribes func to event_type. Bound methods are held by weak reference. If debounce is given (milliseconds)
+    a burst of events is coalesced into one call to func, made on the Tk event loop with the data of the latest event.
+    """
+    if event_type not in EVENT_TYPES:
         raise InvalidEventType(event_type)
+    key = _subscriber_key(func)
+    _remove_existing(event_type, key)
     if before:
-        if event_type not in subscribers_before:
-            subscribers_before[event_type] = set()
-        subscribers_before[event_type].add(func)
+        phase = subscribers_before
     elif after:
-        if event_type not in subscribers_after:
-            subscribers_after[event_type] = set()
-        subscribers_after[event_type].add(func)
+        phase = subscribers_after
     else:
-        if event_type not in subscribers:
-            subscribers[event_type] = set()
-        subscribers[event_type].add(func)
+        phase = subscribers
+    sub = _Subscriber(event_type, func, phase, debounce=debounce)
+    phase.setdefault(event_type, {})[key] = sub
+    _dispatch_tables.pop(event_type, None)
+    if _scopes:
+        _scopes[-1].add(sub)
+    return sub
+
+
+def unsubscribe(event_type, func):
+    _remove_existing(event_type, _subscriber_key(func))
+
+
+class SubscriptionScope:
+    """
+    Collects subscriptions so that they can be removed together with close(). Subscriptions made with subscribe()
+    inside a "with scope:" block are added to the scope. If an owner widget is given the scope is closed when the
+    widget is destroyed.
+
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('select_station', self._on_select_station)
+            subscribe('input_ok', self._input_ok)
+    """
+
+    def __init__(self, owner=None):
+        self._subscriptions = []
+        if hasattr(owner, 'bind'):
+            owner.bind('<Destroy>', lambda event, widget=owner: event.widget is widget and self.close(), add='+')
+
+    def __enter__(self):
+        _scopes.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _scopes.remove(self)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, sub):
+        self._subscriptions.append(sub)
+
+    def subscribe(self, event_type, func, **kwargs):
+        sub = subscribe(event_type, func, **kwargs)
+        self.add(sub)
+        return sub
+
+    def close(self):
+        """
+        Removes all subscriptions in the scope. Subscriptions that have since been replaced are left untouched.
+        """
+        for sub in self._subscriptions:
+            sub.discard()
+        self._subscriptions = []
+
+
+@contextlib.contextmanager
+def batch():
+    """
+    Defers all events posted inside the with-block (including events posted by handlers) until the outermost
+    batch ends. Each event type is then posted once, in the order it was first posted, with the data and keyword
+    arguments of the last post.
+
+        with batch():
+            self._components['series'].value = series
+            ...
+            post_event('load_platform_info', data)
+    """
+    global _batch_depth
+    _batch_depth += 1
+    _update_fast_dispatch_depth()
+    try:
+        yield
+    finally:
+        _batch_depth -= 1
+        _update_fast_dispatch_depth()
+        if not _batch_depth:
+            _flush_batch()
+
+
+def _flush_batch():
+    pending = list(_batch_events.values())
+    _batch_events.clear()
+    for event_type, data, kwargs in pending:
+        post_event(event_type, data, **kwargs)
 
 
 def post_event(event_type, data, **kwargs):
-    for sub in [subscribers_before, subscribers, subscribers_after]:
-        if event_type not in sub:
-            continue
-        for func in sub[event_type]:
-            func(data, **kwargs)
+    if len(_event_stack) >= _fast_dispatch_depth:
+        _post_event_checked(event_type, data, kwargs)
+        return
+    _event_stack.append(event_type)
+    # Everything after the push is inside the try so that the event is always popped
+    try:
+        table = _dispatch_tables.get(event_type)
+        if table is None:
+            table = _compile_dispatch_table(event_type)
+        handlers, direct = table
+        if direct:
+            for sub, owner_ref, function in handlers:
+                # A subscription whose owner is collected is discarded (inactive) by the weakref callback, so an
+                # active subscription always has its owner. The function is called with the owner instead of
+                # building a bound method for every call.
+                if sub.active:
+                    function(owner_ref(), data, **kwargs)
+        else:
+            for handler in handlers:
+                _dispatch(handler[0], data, kwargs)
+    finally:
+        _event_stack.pop()
+
+
+def _post_event_checked(event_type, data, kwargs):
+    """
+    post_event while events are batched, recorded or profiled, or nested deeper than the fast path allows.
+    """
+    if _batch_depth:
+        _batch_events[event_type] = (event_type, data, kwargs)
+        return
+    if len(_event_stack) >= MAX_EVENT_DEPTH:
+        raise EventCascadeError(_event_stack + [event_type])
+    _event_stack.append(event_type)
+    try:
+        if _journal is not None:
+            _write_journal_record(event_type, data, kwargs)
+        if _profiling:
+            _add_cascade_event(event_type)
+        table = _dispatch_tables.get(event_type)
+        if table is None:
+            table = _compile_dispatch_table(event_type)
+        for handler in table[0]:
+            _dispatch(handler[0], data, kwargs)
+    finally:
+        _event_stack.pop()
+        if not _event_stack and _current_cascade:
+            _end_cascade()
+
+
+def _dispatch(sub, data, kwargs):
+    if not sub.active:
+        # Removed by a handler earlier in this dispatch
+        return
+    if sub.owner_ref is None:
+        owner = None
+    else:
+        owner = sub.owner_ref()
+        if owner is None:
+            sub.discard()
+            return
+    if sub.debounce is not None:
+        sub.schedule(owner, data, kwargs)
+    else:
+        _call(sub, owner, data, kwargs)
+
+
+def _compile_dispatch_table(event_type):
+    handlers = []
+    for phase in [subscribers_before, subscribers, subscribers_after]:
+        handlers.extend((sub, sub.owner_ref, sub.function) for sub in phase.get(event_type, {}).values())
+    direct = all(sub.owner_ref is not None and sub.debounce is None for sub, owner_ref, function in handlers)
+    table = _dispatch_tables[event_type] = (tuple(handlers), direct)
+    return table
+
+
+def _update_fast_dispatch_depth():
+    global _fast_dispatch_depth
+    if _batch_depth or _journal is not None or _profiling:
+        _fast_dispatch_depth = 0
+    else:
+        _fast_dispatch_depth = MAX_EVENT_DEPTH
+
+
+def start_journal(path):
+    """
+    Starts recording every posted event to the journal at <path>. The journal is a text file with one compact json
+    record per line (appended to if the file exists):
+        t: time of the event (seconds since epoch)
+        e: event_type
+        d: data
+        k: keyword arguments (left out if empty)
+        n: nesting depth of post_event (1 for events not posted by a handler)
+        x: set to 1 if data or keyword arguments could not be serialised (e.g. widgets). Such events can not be
+           replayed.
+    """
+    global _journal
+    stop_journal()
+    _journal = open(path, 'a', encoding='utf-8', buffering=1)
+    _update_fast_dispatch_depth()
+
+
+def stop_journal():
+    global _journal
+    if _journal is None:
+        return
+    _journal.close()
+    _journal = None
+    _update_fast_dispatch_depth()
+
+
+def is_recording():
+    return _journal is not None
+
+
+def _write_journal_record(event_type, data, kwargs):
+    not_serialisable = []
+
+    def default(obj):
+        if isinstance(obj, os.PathLike):
+            return os.fspath(obj)
+        if isinstance(obj, (set, frozenset)):
+            return sorted(obj, key=str)
+        not_serialisable.append(obj)
+        return repr(obj)
+
+    # Recording must never stop the event from being dispatched
+    record = dict(t=round(time.time(), 3), e=event_type, d=data, n=len(_event_stack))
+    if kwargs:
+        record['k'] = kwargs
+    try:
+        line = json.dumps(record, default=default, separators=(',', ':'), ensure_ascii=False)
+        if not_serialisable:
+            record['x'] = 1
+            line = json.dumps(record, default=repr, separators=(',', ':'), ensure_ascii=False)
+    except (TypeError, ValueError):
+        # E.g. dicts with keys that are not strings
+        line = json.dumps(dict(t=record['t'], e=event_type, n=record['n'], x=1), separators=(',', ':'))
+    try:
+        _journal.write(line + '\n')
+    except (OSError, ValueError):
+        logger.error(f'Could not write event {event_type} to the journal: {traceback.format_exc()}')
+
+
+def post_event_threadsafe(event_type, data, **kwargs):
+    """
+    Same as post_event but can be called from any thread. Events posted from a thread other than the Tk thread are
+    queued and dispatched in the Tk thread by the pump started with start_pump.
+    """
+    call_in_main_thread(post_event, event_type, data, **kwargs)
+
+
+def call_in_main_thread(func, *args, **kwargs):
+    """
+    Calls func in the Tk thread. If called from the Tk thread func is called directly, otherwise the call is queued
+    and made by the pump started with start_pump.
+    """
+    if threading.get_ident() == _main_thread_id:
+        func(*args, **kwargs)
+        return
+    _main_loop_queue.put((func, args, kwargs))
+
+
+def start_pump(widget, interval=50):
+    """
+    Starts draining the queue of calls made from worker threads every <interval> ms using widget.after.
+    Must be called from the Tk thread.
+    """
+    global _pump_widget, _pump_interval, _main_thread_id
+    stop_pump()
+    _pump_widget = widget
+    _pump_interval = interval
+    _main_thread_id = threading.get_ident()
+    _drain_main_loop_queue()
+
+
+def stop_pump():
+    global _pump_widget, _pump_after_id
+    if _pump_widget is not None and _pump_after_id is not None:
+        try:
+            _pump_widget.after_cancel(_pump_after_id)
+        except Exception:
+            pass
+    _pump_widget = None
+    _pump_after_id = None
+
+
+def _drain_main_loop_queue():
+    global _pump_after_id
+    while True:
+        try:
+            func, args, kwargs = _main_loop_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.error(traceback.format_exc())
+    if _pump_widget is not None:
+        _pump_after_id = _pump_widget.after(_pump_interval, _drain_main_loop_queue)
+
+
+def _call(sub, owner, data, kwargs):
+    """
+    Calls the function of the subscription, with owner as first argument if it is a method.
+    """
+    args = (data,) if owner is None else (owner, data)
+    if not _profiling:
+        sub.function(*args, **kwargs)
+        return
+    t0 = time.perf_counter()
+    try:
+        sub.function(*args, **kwargs)
+    finally:
+        _add_profile_entry(sub.event_type, sub.name, time.perf_counter() - t0)
+
+
+class _ProfileEntry:
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.
+        self.max_time = 0.
+        self.max_depth = 0
+
+    def add(self, duration, depth):
+        self.calls += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.max_depth = max(self.max_depth, depth)
+
+    def as_dict(self):
+        return dict(calls=self.calls,
+                    total_time=self.total_time,
+                    mean_time=self.total_time / self.calls,
+                    max_time=self.max_time,
+                    max_depth=self.max_depth)
+
+
+def _add_profile_entry(event_type, handler_name, duration):
+    key = (event_type, handler_name)
+    entry = _profile.get(key)
+    if entry is None:
+        entry = _profile[key] = _ProfileEntry()
+    entry.add(duration, len(_event_stack))
+
+
+def enable_profiling(enable=True):
+    global _profiling
+    _profiling = enable
+    if not enable:
+        # A cascade being recorded is not ended by the fast path
+        _current_cascade.clear()
+    _update_fast_dispatch_depth()
+
+
+def is_profiling():
+    return _profiling
+
+
+def reset_profile():
+    _profile.clear()
+    _cascades.clear()
+    _cascade_edges.clear()
+
+
+def get_profile():
+    """
+    Returns a snapshot of the profile as a dict: (event_type, handler_name) -> dict with
+    calls, total_time, mean_time, max_time (seconds) and max_depth (nesting depth of post_event).
+    :return:
+    """
+    return {key: entry.as_dict() for key, entry in _profile.items()}
+
+
+def get_profile_report(sort_by='total_time'):
+    """
+    Returns the profile as a text table sorted (descending) on the given column.
+    :return:
+    """
+    rows = sorted(get_profile().items(), key=lambda item: item[1][sort_by], reverse=True)
+    lines = [f'{"calls":>7} {"total [ms]":>11} {"mean [ms]":>10} {"max [ms]":>10} {"depth":>5}  event_type: handler']
+    for (event_type, handler), info in rows:
+        lines.append(f'{info["calls"]:>7} '
+                     f'{info["total_time"] * 1000:>11.1f} '
+                     f'{info["mean_time"] * 1000:>10.2f} '
+                     f'{info["max_time"] * 1000:>10.1f} '
+                     f'{info["max_depth"]:>5}  '
+                     f'{event_type}: {handler}')
+    return '\n'.join(lines)
+
+
+class _CascadeEntry:
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.
+        self.max_time = 0.
+        self.max_events = 0
+        self.slowest_path = []
+
+    def add(self, duration, path):
+        self.calls += 1
+        self.total_time += duration
+        self.max_events = max(self.max_events, len(path))
+        if duration >= self.max_time:
+            self.max_time = duration
+            self.slowest_path = path
+
+    def as_dict(self):
+        return dict(calls=self.calls,
+                    total_time=self.total_time,
+                    mean_time=self.total_time / self.calls,
+                    max_time=self.max_time,
+                    max_events=self.max_events,
+                    slowest_path=list(self.slowest_path))
+
+
+def _add_cascade_event(event_type):
+    depth = len(_event_stack)
+    if depth == 1:
+        _current_cascade[:] = [time.perf_counter()]
+    elif not _current_cascade:
+        # Profiling was turned on in the middle of a cascade
+        return
+    else:
+        edge = (_event_stack[-2], event_type)
+        _cascade_edges[edge] = _cascade_edges.get(edge, 0) + 1
+    _current_cascade.append((depth, event_type))
+
+
+def _end_cascade():
+    t0, *path = _current_cascade
+    _current_cascade.clear()
+    root = path[0][1]
+    entry = _cascades.get(root)
+    if entry is None:
+        entry = _cascades[root] = _CascadeEntry()
+    entry.add(time.perf_counter() - t0, path)
+
+
+def get_cascades():
+    """
+    Returns a snapshot of the recorded cascades as a dict: root event_type -> dict with calls, total_time,
+    mean_time, max_time (seconds), max_events (events in the largest cascade) and slowest_path (list of
+    (depth, event_type) in the slowest cascade). Recorded when profiling.
+    :return:
+    """
+    return {root: entry.as_dict() for root, entry in _cascades.items()}
+
+
+def get_cascade_graph():
+    """
+    Returns the cascade graph as a dict: (event_type, event_type posted by one of its handlers) -> number of times.
+    Recorded when profiling.
+    :return:
+    """
+    return dict(_cascade_edges)
+
+
+def get_cascade_report(sort_by='total_time'):
+    """
+    Returns the recorded cascades as text sorted (descending) on the given column, each followed by its slowest
+    path of events.
+    :return:
+    """
+    rows = sorted(get_cascades().items(), key=lambda item: item[1][sort_by], reverse=True)
+    lines = [f'{"calls":>7} {"total [ms]":>11} {"max [ms]":>10} {"events":>6}  root event_type']
+    for root, info in rows:
+        lines.append(f'{info["calls"]:>7} '
+                     f'{info["total_time"] * 1000:>11.1f} '
+                     f'{info["max_time"] * 1000:>10.1f} '
+                     f'{info["max_events"]:>6}  '
+                     f'{root}')
+        if len(info['slowest_path']) > 1:
+            for depth, event_type in info['slowest_path'][1:]:
+                lines.append(f'{"":>38}{"  " * depth}-> {event_type}')
+    return '\n'.join(lines)
+
+
+def print_profile(sort_by='total_time'):
+    print('=' * 50)
+    print('Event handler profile:')
+    print('-' * 50)
+    print(get_profile_report(sort_by=sort_by))
+    print('-' * 50)
+    print('Event cascades:')
+    print('-' * 50)
+    print(get_cascade_report(sort_by=sort_by))
+    print('=' * 50)
 
 
 def nr_subscribers(event_type):
-    return len(subscribers[event_type])
+    return len([sub for sub in subscribers.get(event_type, {}).values() if sub.func is not None])
 
 
 def print_even_types():
@@ -112,14 +763,14 @@ def print_subscribers():
     print('-' * 50)
     for event_type in sorted(subscribers_before):
         print(' ' * 4, 'event_type:', event_type)
-        for func in subscribers_before[event_type]:
+        for func in subscribers_before[event_type].values():
             print(' ' * 8, func)
     print('-' * 50)
     print('Current subscribers are:')
     print('-' * 50)
     for event_type in sorted(subscribers):
         print(' ' * 4, 'event_type:', event_type)
-        for func in subscribers[event_type]:
+        for func in subscribers[event_type].values():
             print(' ' * 8, func)
     print('=' * 50)
 
@@ -0,0 +1,80 @@
+"""
+Stand-in for a sharktools.platform_info plugin, used to test and benchmark the platform path without the ship's
+database. The answers, latency and errors are given by a scenario file (see scenario.yaml). plugins.discover uses this
+plugin instead of the installed ones when the environment variable SHARKTOOLS_FAKE_PLATFORM is set to the path of a
+scenario file.
+"""
+import logging
+import pathlib
+import random
+import threading
+import time
+
+import yaml
+from yaml.loader import SafeLoader
+
+from . import exceptions
+
+logger = logging.getLogger(__file__)
+
+EXAMPLE_SCENARIO_PATH = pathlib.Path(pathlib.Path(__file__).parent, 'scenario.yaml')
+
+_scenario = dict()
+_random = random.Random()
+_lock = threading.Lock()
+_state_index = 0
+
+# Number of calls to get_current_data
+nr_calls = 0
+
+
+def load_scenario(path=EXAMPLE_SCENARIO_PATH):
+    """
+    Loads the scenario file and restarts the scenario from the first state.
+    :return:
+    """
+    with open(path, encoding='utf-8') as fid:
+        scenario = yaml.load(fid, Loader=SafeLoader) or {}
+    set_scenario(scenario)
+    logger.info(f'Using fake platform scenario {path}')
+
+
+def set_scenario(scenario):
+    global _scenario, _state_index, nr_calls
+    with _lock:
+        _scenario = dict(scenario)
+        _random.seed(_scenario.get('seed'))
+        _state_index = 0
+        nr_calls = 0
+
+
+def get_platform_info(**kwargs) -> dict:
+    return dict(platform_name=_scenario.get('platform_name', 'Fake platform'))
+
+
+def _next_state():
+    global _state_index, nr_calls
+    with _lock:
+        nr_calls += 1
+        states = _scenario.get('states') or [{}]
+        state = states[min(_state_index, len(states) - 1)]
+        _state_index += 1
+        latency = max(0., _scenario.get('latency', 0.) + _random.uniform(-1, 1) * _scenario.get('jitter', 0.))
+        if _random.random() < _scenario.get('hang_rate', 0.):
+            latency = _scenario.get('hang_time', 60.)
+        fail = _random.random() < _scenario.get('error_rate', 0.)
+    return dict(state), latency, fail
+
+
+def get_current_data(**kwargs) -> dict:
+    state, latency, fail = _next_state()
+    time.sleep(latency)
+    if fail:
+        raise exceptions.PlatformConnectionError()
+    error = state.pop('error', None)
+    if error:
+        exception = getattr(exceptions, error, exceptions.PlatformException)
+        if 'event_type' in state:
+            raise exception(state['event_type'])
+        raise exception()
+    return state
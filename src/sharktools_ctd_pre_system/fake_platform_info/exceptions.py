@@ -0,0 +1,19 @@
+class PlatformException(Exception):
+    pass
+
+
+class PlatformConnectionError(PlatformException):
+    def __init__(self, message='Could not connect to Platform database!'):
+        super().__init__(message)
+
+
+class PlatformEventTypeNotRunningError(PlatformException):
+    def __init__(self, event_type=''):
+        super().__init__(f'Event type {event_type} not running!')
+        self.event_type = event_type
+
+
+class SeveralPlatformEventsRunningError(PlatformException):
+    def __init__(self, event_type=''):
+        super().__init__(f'Several events are running for event type: {event_type}')
+        self.event_type = event_type
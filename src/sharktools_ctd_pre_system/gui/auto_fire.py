@@ -8,6 +8,7 @@ from shark_tkinter_lib import tkinter_widgets as tkw
 
 from . import components
 from ..events import subscribe
+from ..events import SubscriptionScope
 from ..saves import SaveSelection
 
 COLORS = [
@@ -100,12 +101,14 @@ class FrameAutoFire(tk.Frame, SaveSelection):
 
         self.load_selection()
 
-        subscribe('confirm_sensors', self._on_confirm_sensors)
-        subscribe('select_station', self._on_change_station)
-        subscribe('focus_out_wadep', self.set_max_depth_to_autofire)
-        subscribe('select_nr_bottles_on_rosette', self._on_select_nr_bottles_on_rosette)
-        subscribe('select_auto_fire_depth', self._validate_autofire_table)
-        subscribe('select_auto_fire_bottle', self._validate_autofire_table)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('confirm_sensors', self._on_confirm_sensors)
+            subscribe('select_station', self._on_change_station)
+            subscribe('focus_out_wadep', self.set_max_depth_to_autofire)
+            subscribe('select_nr_bottles_on_rosette', self._on_select_nr_bottles_on_rosette)
+            subscribe('select_auto_fire_depth', self._validate_autofire_table)
+            subscribe('select_auto_fire_bottle', self._validate_autofire_table)
 
     def _build_frame(self):
 
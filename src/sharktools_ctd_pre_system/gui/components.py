@@ -10,6 +10,8 @@ from operator import itemgetter
 
 from ..events import post_event
 from ..events import subscribe
+from ..events import SubscriptionScope
+from ..options import RangeValidator
 from .. import saves
 
 import shark_tkinter_lib.tkinter_widgets as tkw
@@ -159,7 +161,9 @@ class AddSampInfo(tk.Frame, Common):
 
         self._create_frame()
 
-        subscribe('load_platform_info', self._update)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('load_platform_info', self._update)
 
     def _create_frame(self):
         layout = dict(padx=2,
@@ -711,6 +715,10 @@ class CallbackButton(tk.Frame, Common):
     def set_state(self, state):
         self.button.configure(state=state)
 
+    def set_title(self, title):
+        self.title = title
+        self.button.configure(text=title)
+
 
 class DepthEntry(tk.Frame, Common):
 
@@ -855,8 +863,7 @@ class FloatEntry(tk.Frame, Common):
         self.title = title
         self.width = width
         self.state = state
-        self.min_value = min_value
-        self.max_value = max_value
+        self.validator = RangeValidator(min_value, max_value)
 
         super().__init__(parent)
         self.grid(**self.grid_frame)
@@ -888,11 +895,7 @@ class FloatEntry(tk.Frame, Common):
     def _on_focus_out(self, *args):
         string = self._stringvar.get()
         if string:
-            if self.min_value is not None and float(string) < self.min_value:
-                string = str(self.min_value)
-            if self.max_value is not None and float(string) > self.max_value:
-                string = str(self.max_value)
-            self._stringvar.set(string)
+            self._stringvar.set(str(self.validator.clamp(string)))
         post_event(f'focus_out_{self._id}', self.value)
         self._focus_next()
 
@@ -953,8 +956,7 @@ class IntEntry(tk.Frame, Common):
         self.title = title
         self.width = width
         self.state = state
-        self.min_value = min_value
-        self.max_value = max_value
+        self.validator = RangeValidator(min_value, max_value)
 
         super().__init__(parent)
         self.grid(**self.grid_frame)
@@ -986,11 +988,7 @@ class IntEntry(tk.Frame, Common):
     def _on_focus_out(self, *args):
         string = self._stringvar.get()
         if string:
-            if self.min_value is not None and int(string) < self.min_value:
-                string = str(self.min_value)
-            if self.max_value is not None and int(string) > self.max_value:
-                string = str(self.max_value)
-            self._stringvar.set(string)
+            self._stringvar.set(str(self.validator.clamp(string)))
         post_event(f'focus_out_{self._id}', self.value)
 
     def _on_change_entry(self, *args):
@@ -1139,7 +1137,9 @@ class SelectedInstrumentTextFrame(tk.Frame, Common):
         self.monospace_label = MonospaceLabel(self, textvariable=self._stringvar)
         self.monospace_label.grid(row=0, column=0, padx=5, pady=5, sticky='w')
 
-        subscribe('confirm_sensors', self.set)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('confirm_sensors', self.set)
 
     @property
     def instrument(self):
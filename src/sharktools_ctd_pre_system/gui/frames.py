@@ -13,16 +13,21 @@ from sharktools_ctd_pre_system import plugins
 import uuid
 
 import psutil
-from ..options import get_options
+from ..options import get_options_registry
 from shark_tkinter_lib import tkinter_widgets as tkw
 
 from . import components
 from .. import lists
+from ..events import batch
+from ..events import call_in_main_thread
 from ..events import post_event
 from ..events import print_subscribers
 from ..events import subscribe
+from ..events import SubscriptionScope
 from ..gui.translator import Translator
-from ..saves import Defaults
+from ..saves import after_restore
+from ..saves import get_cast_history
+from ..saves import get_defaults
 from ..saves import SaveSelection
 from ctd_pre_system import exceptions as pre_system_exceptions
 from sharktools_ctd_pre_system.gui import auto_fire
@@ -34,10 +39,16 @@ TEXT_LJUST = 10
 
 translator = Translator()
 
-options = get_options()
+options = get_options_registry()
 
 SHIP_TO_INTERNAL = {'77SE': '7710'}
 
+# Milliseconds between updates of the progress shown while loading platform info
+PLATFORM_PROGRESS_INTERVAL = 250
+
+# Milliseconds to wait for more events before looking up data file info on the server
+DATA_FILE_INFO_DEBOUNCE = 200
+
 
 class MissingInformationError(Exception):
     def __init__(self, missing_list, message=''):
@@ -97,29 +108,39 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
         self._saves_id_key = 'StationPreSystemFrame'
         self._selections_to_store = []
 
+        self._platform_request = None
+        self._platform_progress_id = None
+
         self._build_frame()
 
         self._initiate_frame()
 
         self.load_selection()
 
-        subscribe('confirm_sensors', self._set_instrument)
-        subscribe('confirm_sensors', self._set_next_series)
-        # subscribe('focus_out_cruise', self._set_next_series)
-        subscribe('select_station', self._on_select_station)
-        subscribe('focus_out_station', self._on_select_station)
-        # subscribe('return_position', self._on_return_position)
-        subscribe('focus_out_depth', self._on_focus_out_depth)
+        after_restore(self._start_platform_polling)
 
-        subscribe('button_platform', self._on_return_load_platform_info)
-        subscribe('button_seasave', self._on_return_seasave)
+        self._subscriptions = SubscriptionScope(self)
+        # A fetch still running when the frame is destroyed (e.g. on instrument switch) is cancelled with the
+        # subscriptions
+        self.bind('<Destroy>', lambda event: event.widget is self and self._cancel_platform_request(), add='+')
+        with self._subscriptions:
+            subscribe('confirm_sensors', self._set_instrument)
+            subscribe('confirm_sensors', self._set_next_series)
+            # subscribe('focus_out_cruise', self._set_next_series)
+            subscribe('select_station', self._on_select_station)
+            subscribe('focus_out_station', self._on_select_station)
+            # subscribe('return_position', self._on_return_position)
+            subscribe('focus_out_depth', self._on_focus_out_depth)
 
-        subscribe('button_goto_processing_simple', self._on_return_goto_processing_simple)
-        subscribe('button_goto_processing_advanced', self._on_return_goto_processing_advanced)
+            subscribe('button_platform', self._on_return_load_platform_info)
+            subscribe('button_seasave', self._on_return_seasave)
 
-        subscribe('missing_input', self._missing_input)
-        subscribe('input_ok', self._input_ok)
-        subscribe('add_components', self._add_components)
+            subscribe('button_goto_processing_simple', self._on_return_goto_processing_simple)
+            subscribe('button_goto_processing_advanced', self._on_return_goto_processing_advanced)
+
+            subscribe('missing_input', self._missing_input)
+            subscribe('input_ok', self._input_ok)
+            subscribe('add_components', self._add_components)
 
     @property
     def station(self):
@@ -501,6 +522,8 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
         meta_cond = {key.upper(): value for key, value in metadata_conditions.items()}
         self.controller.update_main_psa_file(**data, metadata_admin=meta_admin, metadata_conditions=meta_cond, source_dir=True, check_serno=True)
 
+        return dict(data, metadata_admin=meta_admin, metadata_conditions=meta_cond)
+
     def _on_return_seasave(self, *args):
         self._components['station'].value = self._components['station'].value.replace(',', '.')
         self._components['station'].update()
@@ -526,8 +549,9 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
 
     def _run_seasave(self):
         try:
-            self._modify_seasave_file()
+            data = self._modify_seasave_file()
             self.controller.run_seasave()
+            self._add_cast_to_history(data)
             self._time_disabled_widget(self._components['seasave'].button,
                                        program_running='Seasave.exe',
                                        then_run=self._on_close_seasave
@@ -543,6 +567,18 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
             messagebox.showerror('Run seasave', f'Något gick fel!\n{sep}\n{e}\n\n{sep}\n{traceback.format_exc()}')
             raise
 
+    def _add_cast_to_history(self, data):
+        if not data:
+            return
+        try:
+            get_cast_history().add_cast(instrument=data.get('instrument', ''),
+                                        cruise=f"{data.get('year', '')}-{data.get('cruise', '')}",
+                                        series=data.get('series', ''),
+                                        station=data.get('station', ''),
+                                        metadata=data)
+        except Exception:
+            logger.error(f'Could not add cast to history: {traceback.format_exc()}')
+
     def _on_close_seasave(self):
         post_event('close_seasave', None)
         self._components['station'].set('')
@@ -558,11 +594,12 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
         return False
 
     def _time_disabled_widget(self, widget, seconds=None, program_running='', then_run=None):
+        # Runs in a worker thread. All Tk calls are passed on to the Tk thread.
         def sub_func():
-            widget.config(state='disabled')
+            call_in_main_thread(widget.config, state='disabled')
             if seconds:
                 time.sleep(seconds)
-                widget.config(state='normal')
+                call_in_main_thread(widget.config, state='normal')
             elif program_running:
                 time.sleep(2)
                 running = self._program_is_running(program_running)
@@ -570,8 +607,8 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
                     time.sleep(1)
                     running = self._program_is_running(program_running)
                 if then_run:
-                    then_run()
-                widget.config(state='normal')
+                    call_in_main_thread(then_run)
+                call_in_main_thread(widget.config, state='normal')
 
         t = threading.Thread(target=sub_func)
         t.daemon = True  # close pipe if GUI process exits
@@ -588,16 +625,90 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
             return False
 
     def _on_return_load_platform_info(self, *args):
+        if self._platform_request and self._platform_request.active:
+            # The button cancels the ongoing request
+            self._platform_request.cancel()
+            self._reset_platform_button()
+            return
         if not plugins.platform_info:
             data = plugins.get_current_platform_data()
             self._set_event_id(data)
             self._set_parent_event_id(data)
             return
+        cred_path = self._components['platform_credentials_path'].get()
+        plugins.start_polling(path_to_credentials=cred_path)
+        data = plugins.get_cached_platform_data(path_to_credentials=cred_path)
+        if data is not None:
+            # Recent enough snapshot from the poller
+            self._on_platform_data(data)
+            return
+        self._platform_request = plugins.PlatformDataRequest(self._on_platform_data,
+                                                             self._on_platform_data_error,
+                                                             path_to_credentials=cred_path)
+        self._platform_request.start()
+        self._show_platform_progress()
+
+    def _start_platform_polling(self):
         try:
             cred_path = self._components['platform_credentials_path'].get()
+        except Exception:
+            return
+        plugins.start_polling(path_to_credentials=cred_path)
+
+    def _show_platform_progress(self):
+        request = self._platform_request
+        if not request or not request.active:
+            return
+        self._components['platform'].set_title(f'Hämtar information... {request.elapsed:.0f} s\n'
+                                               f'(klicka för att avbryta)')
+        self._platform_progress_id = self.after(PLATFORM_PROGRESS_INTERVAL, self._show_platform_progress)
+
+    def _cancel_platform_request(self):
+        if self._platform_request is not None:
+            self._platform_request.cancel()
+            self._platform_request = None
+        if self._platform_progress_id is not None:
+            try:
+                self.after_cancel(self._platform_progress_id)
+            except Exception:
+                pass
+            self._platform_progress_id = None
+
+    def _reset_platform_button(self):
+        self._components['platform'].set_title(self.platform_button_text)
+
+    def _on_platform_data(self, data):
+        if not self.winfo_exists():
+            return
+        self._reset_platform_button()
+        # Setting the components and posting load_platform_info triggers a cascade of handlers. Let it run once.
+        with batch():
+            self._load_platform_info(data)
+
+    def _on_platform_data_error(self, e):
+        if not self.winfo_exists():
+            return
+        self._reset_platform_button()
+        self._show_platform_error(e)
 
-            data = plugins.get_current_platform_data(path_to_credentials=cred_path)
+    def _show_platform_error(self, e):
+        """
+        Shows the error to the user.
+        :return: True if the error is a known platform error
+        """
+        if isinstance(e, plugins.PlatformDataTimeout):
+            messagebox.showerror('Load information from Platform', str(e))
+            return True
+        if plugins.platform_info_exceptions and isinstance(e, plugins.platform_info_exceptions.PlatformException):
+            messagebox.showerror('Load information from Platform', str(e))
+            return True
+        text = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+        logger.critical(text)
+        messagebox.showerror('Could not load information from Platform', text)
+        return False
 
+    def _load_platform_info(self, data):
+        try:
             pos = data.get('position')
             if pos:
                 lat = pos[0]
@@ -699,11 +810,8 @@ class StationPreSystemFrame(tk.Frame, SaveSelection, CommonFrameMethods):
             post_event('load_platform_info', data)
 
         except Exception as e:
-            if plugins.platform_info_exceptions and isinstance(e, plugins.platform_info_exceptions.PlatformException):
-                messagebox.showerror('Load information from Platform', str(e))
+            if self._show_platform_error(e):
                 return
-            logger.critical(traceback.format_exc())
-            messagebox.showerror('Could not load information from Platform', traceback.format_exc())
             raise
 
         # except platform_exceptions.PlatformConnectionError as e:
@@ -748,9 +856,11 @@ class MetadataAdminFrame(tk.Frame, SaveSelection, CommonFrameMethods):
         self._saves_id_key = 'MetadataAdminFrame'
         self._selections_to_store = []
 
-        subscribe('missing_input', self._missing_input)
-        subscribe('input_ok', self._input_ok)
-        subscribe('select_default_user', self._on_change_default_user)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('missing_input', self._missing_input)
+            subscribe('input_ok', self._input_ok)
+            subscribe('select_default_user', self._on_change_default_user)
 
         self._build_frame()
 
@@ -784,7 +894,7 @@ class MetadataAdminFrame(tk.Frame, SaveSelection, CommonFrameMethods):
 
     def _initiate_frame(self):
         for key, comp in self._components.items():
-            comp.values = options.get(key)
+            options.bind(key, comp)
 
     def get_data(self):
         data = {key: comp.value for key, comp in self._components.items()}
@@ -827,12 +937,14 @@ class MetadataConditionsFrame(tk.Frame, SaveSelection, CommonFrameMethods):
         self._saves_id_key = 'MetadataConditionsFrame'
         self._selections_to_store = []
 
-        subscribe('missing_input', self._missing_input)
-        subscribe('input_ok', self._input_ok)
-        subscribe('select_default_user', self._on_change_default_user)
-        subscribe('set_water_depth', self._on_set_water_depth)
-        subscribe('close_seasave', self._on_close_seasave)
-        subscribe('load_platform_info', self.update_load_platform_info)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('missing_input', self._missing_input)
+            subscribe('input_ok', self._input_ok)
+            subscribe('select_default_user', self._on_change_default_user)
+            subscribe('set_water_depth', self._on_set_water_depth)
+            subscribe('close_seasave', self._on_close_seasave)
+            subscribe('load_platform_info', self.update_load_platform_info)
 
         self._build_frame()
 
@@ -861,29 +973,21 @@ class MetadataConditionsFrame(tk.Frame, SaveSelection, CommonFrameMethods):
 
         self._components['wadep'] = components.IntEntry(frame, 'wadep',
                                                         title=translator.get_readable('wadep').ljust(text_ljust),
-                                                        min_value=options.get('wadep').get('min'),
-                                                        max_value=options.get('wadep').get('max'), row=1, column=0,
-                                                        **layout)
+                                                        row=1, column=0, **layout)
 
         self._components['winsp'] = components.FloatEntry(frame, 'winsp',
                                                           title=translator.get_readable('winsp').ljust(text_ljust),
-                                                          min_value=options.get('winsp').get('min'),
-                                                          max_value=options.get('winsp').get('max'), row=2, column=0,
-                                                          **layout)
+                                                          row=2, column=0, **layout)
 
         self._components['windir'] = components.LabelDropdownList(frame, 'windir',
                                                                   title=translator.get_readable('windir').ljust(text_ljust),
                                                                   row=3, column=0, **layout)
         self._components['airpres'] = components.FloatEntry(frame, 'airpres',
                                                             title=translator.get_readable('airpres').ljust(text_ljust),
-                                                            min_value=options.get('airpres').get('min'),
-                                                            max_value=options.get('airpres').get('max'), row=4,
-                                                            column=0, **layout)
+                                                            row=4, column=0, **layout)
 
         self._components['airtemp'] = components.FloatEntry(frame, 'airtemp',
                                                             title=translator.get_readable('airtemp').ljust(text_ljust),
-                                                            min_value=options.get('airtemp').get('min'),
-                                                            max_value=options.get('airtemp').get('max'),
                                                             row=5, column=0, **layout)
         self._components['weath'] = components.LabelDropdownList(frame, 'weath', title=translator.get_readable('weath').ljust(text_ljust), row=6, column=0, **layout)
         self._components['cloud'] = components.LabelDropdownList(frame, 'cloud', title=translator.get_readable('cloud').ljust(text_ljust), row=7, column=0, **layout)
@@ -909,8 +1013,8 @@ class MetadataConditionsFrame(tk.Frame, SaveSelection, CommonFrameMethods):
     def _initiate_frame(self):
         self._components['windir'].values = [str(i).zfill(2) for i in range(37)] + ['99']
 
-        for key in ['weath', 'cloud', 'waves', 'iceob']:
-            self._components[key].values = options.get(key)
+        for key in ['wadep', 'winsp', 'airpres', 'airtemp', 'weath', 'cloud', 'waves', 'iceob']:
+            options.bind(key, self._components[key])
 
     def get_data(self):
         data = {key: comp.value for key, comp in self._components.items()}
@@ -1049,11 +1153,13 @@ class FrameSelectInstrument(tk.Frame, SaveSelection):
         self.load_selection()
 
     def _add_subscribers(self):
-        subscribe('select_instrument', self._on_select_instrument)
-        subscribe('change_config_path', self._on_change_config_path)
-        subscribe('change_data_path_local', self._on_change_data_path)
-        subscribe('change_data_path_server', self._on_change_data_path)
-        subscribe('update_components', self._add_components)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('select_instrument', self._on_select_instrument)
+            subscribe('change_config_path', self._on_change_config_path)
+            subscribe('change_data_path_local', self._on_change_data_path)
+            subscribe('change_data_path_server', self._on_change_data_path)
+            subscribe('update_components', self._add_components)
 
     def _build_frame(self):
         layout = dict(padx=5, pady=5, sticky='nsew')
@@ -1235,7 +1341,7 @@ class SelectionInfoFrame(tk.Frame, SaveSelection):
 
         self.load_selection()
 
-        self._set_paths_in_controller()
+        after_restore(self._set_paths_in_controller)
 
     def _set_paths_in_controller(self):
         self._set_config_root_directory()
@@ -1578,13 +1684,16 @@ class FrameManageCTDcastsStation(tk.Frame, SaveSelection):
 
         self._set_default_user()
 
-        subscribe('focus_out_series', self._update_data_file_info)
-        subscribe('toggle_tail', self._update_data_file_info)
-        subscribe('series_step', self._update_data_file_info)
-        subscribe('set_next_series', self._update_data_file_info)
-        subscribe('focus_out_cruise', self._update_data_file_info)
-        subscribe('load_platform_info', self._update_data_file_info)
-        subscribe('update_server_info', self._update_data_file_info)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            for event_type in ['focus_out_series',
+                               'toggle_tail',
+                               'series_step',
+                               'set_next_series',
+                               'focus_out_cruise',
+                               'load_platform_info',
+                               'update_server_info']:
+                subscribe(event_type, self._update_data_file_info, debounce=DATA_FILE_INFO_DEBOUNCE)
 
     def _build_frame(self):
 
@@ -1616,7 +1725,7 @@ class FrameManageCTDcastsStation(tk.Frame, SaveSelection):
         tkw.grid_configure(frame, nr_rows=6)
 
     def _set_default_user(self):
-        default_user = Defaults().user
+        default_user = get_defaults().user
         print('default_user', '::::::::::::::::', default_user)
         self.default_user_frame.set(default_user)
         post_event('select_default_user', default_user)
@@ -14,6 +14,9 @@ from ctd_pre_system.controller import Controller
 from file_explorer.seabird.paths import SBEPaths
 
 from sharktools_ctd_pre_system.events import subscribe
+from sharktools_ctd_pre_system.events import SubscriptionScope
+from sharktools_ctd_pre_system.saves import restoring
+from sharktools_ctd_pre_system.saves import Snapshotter
 
 
 class PageStart(tk.Frame):
@@ -33,24 +36,35 @@ class PageStart(tk.Frame):
         self.sbe_paths = SBEPaths()
         self.controller = Controller(paths_object=self.sbe_paths)
 
+        self._snapshotter = Snapshotter(self, self.save_selection)
+
     def _add_subscribers(self):
-        subscribe('select_instrument', self._on_select_instrument)
-        subscribe('confirm_sensors', self._on_confirm_sensors, before=True)
+        self._subscriptions = SubscriptionScope(self)
+        with self._subscriptions:
+            subscribe('select_instrument', self._on_select_instrument)
+            subscribe('confirm_sensors', self._on_confirm_sensors, before=True)
 
     @property
     def user(self):
         return self.parent_app.user
 
     def startup(self):
-        self._create_frame()
+        # The selections of all frames are restored in one pass when the frames are built
+        with restoring():
+            self._create_frame()
         self._add_subscribers()
         try:
             self.controller.ctd_config_root_directory = self._frame_select_instrument.config_root_directory
             self.controller.ctd_data_root_directory = self._frame_select_instrument.data_root_directory_local
         except FileNotFoundError:
             pass
+        self._snapshotter.start()
 
     def close(self):
+        self._snapshotter.stop()
+        self.save_selection()
+
+    def save_selection(self):
         self._frame_manage_ctd_casts.save_selection()
         self._frame_select_instrument.save_selection()
 
@@ -1,9 +1,216 @@
+import logging
+import pathlib
+import weakref
+
 import yaml
 from yaml.loader import SafeLoader
-import pathlib
+
+logger = logging.getLogger(__file__)
+
+OPTIONS_PATH = pathlib.Path(pathlib.Path(__file__).parent, 'options.yaml')
+
+# Milliseconds between checks of options.yaml for changes (see OptionsRegistry.watch)
+WATCH_INTERVAL = 2000
+
+_registry = None
 
 
 def get_options():
-    with open(pathlib.Path(pathlib.Path(__file__).parent, 'options.yaml')) as fid:
+    with open(OPTIONS_PATH) as fid:
         data = yaml.load(fid, Loader=SafeLoader)
     return data
+
+
+class RangeValidator:
+    """
+    Compiled from an option with min and/or max. Used by components with a validator (FloatEntry and IntEntry) to
+    limit the entered value.
+    """
+
+    def __init__(self, min_value=None, max_value=None):
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def __eq__(self, other):
+        return isinstance(other, RangeValidator) and \
+               (self.min_value, self.max_value) == (other.min_value, other.max_value)
+
+    def __repr__(self):
+        return f'RangeValidator({self.min_value}, {self.max_value})'
+
+    def is_valid(self, value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        if self.min_value is not None and value < self.min_value:
+            return False
+        if self.max_value is not None and value > self.max_value:
+            return False
+        return True
+
+    def clamp(self, value):
+        """
+        Returns value, or the limit it is outside of. Values that are not numbers are returned as they are.
+        :return:
+        """
+        if self.is_valid(value):
+            return value
+        try:
+            value_float = float(value)
+        except (TypeError, ValueError):
+            return value
+        if self.min_value is not None and value_float < self.min_value:
+            return self.min_value
+        return self.max_value
+
+    def apply(self, component):
+        component.validator = self
+
+
+class ChoiceValidator:
+    """
+    Compiled from an option given as a list. Applied to components with values (e.g. dropdown lists).
+    """
+
+    def __init__(self, values):
+        self.values = tuple(values)
+
+    def __eq__(self, other):
+        return isinstance(other, ChoiceValidator) and self.values == other.values
+
+    def __repr__(self):
+        return f'ChoiceValidator({list(self.values)})'
+
+    def apply(self, component):
+        component.values = list(self.values)
+
+
+def compile_option(value):
+    """
+    Compiles an entry in options.yaml into a validator. Returns None for entries that are neither a list nor a
+    min/max range.
+    :return:
+    """
+    if isinstance(value, (list, tuple)):
+        return ChoiceValidator(value)
+    if isinstance(value, dict) and ('min' in value or 'max' in value):
+        return RangeValidator(value.get('min'), value.get('max'))
+    return None
+
+
+class OptionsRegistry:
+    """
+    Holds the entries in options.yaml compiled into validators. Components are bound to an entry with bind and get
+    the validator applied directly and every time options.yaml is changed (see reload and watch). Components are
+    referenced weakly.
+    """
+
+    def __init__(self, file_path=OPTIONS_PATH):
+        self.file_path = pathlib.Path(file_path)
+        self.data = {}
+        self.validators = {}
+        self._mtime = None
+        self._bound = {}
+        self._widget = None
+        self._after_id = None
+        self.reload()
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def get_validator(self, key):
+        return self.validators.get(key)
+
+    def bind(self, key, component):
+        """
+        Applies the validator for key to the component now and when options.yaml is changed.
+        :return:
+        """
+        self._bound.setdefault(key, []).append(weakref.ref(component))
+        validator = self.validators.get(key)
+        if validator is not None:
+            validator.apply(component)
+
+    def is_outdated(self):
+        try:
+            return self.file_path.stat().st_mtime_ns != self._mtime
+        except OSError:
+            return False
+
+    def reload(self):
+        """
+        Reads options.yaml and applies changed validators to the bound components.
+        :return: list of changed keys
+        """
+        try:
+            self._mtime = self.file_path.stat().st_mtime_ns
+            with open(self.file_path, encoding='utf-8') as fid:
+                data = yaml.load(fid, Loader=SafeLoader) or {}
+        except (OSError, yaml.YAMLError):
+            logger.exception(f'Could not read options from {self.file_path}')
+            return []
+        validators = {}
+        for key, value in data.items():
+            validator = compile_option(value)
+            if validator is not None:
+                validators[key] = validator
+        changed = [key for key in set(validators) | set(self.validators)
+                   if validators.get(key) != self.validators.get(key)]
+        self.data = data
+        self.validators = validators
+        for key in changed:
+            self._apply(key)
+        return changed
+
+    def _apply(self, key):
+        validator = self.validators.get(key)
+        alive = []
+        for ref in self._bound.get(key, []):
+            component = ref()
+            if component is None:
+                continue
+            if validator is not None:
+                try:
+                    validator.apply(component)
+                except Exception:
+                    # Widget destroyed
+                    continue
+            alive.append(ref)
+        self._bound[key] = alive
+
+    def watch(self, widget, interval=WATCH_INTERVAL):
+        """
+        Checks options.yaml for changes every <interval> ms using widget.after. Must be called from the Tk thread.
+        :return:
+        """
+        self.stop_watch()
+        self._widget = widget
+
+        def check():
+            if self.is_outdated():
+                logger.info(f'Reloading options from {self.file_path}')
+                self.reload()
+            self._after_id = widget.after(interval, check)
+
+        self._after_id = widget.after(interval, check)
+
+    def stop_watch(self):
+        if self._widget is not None and self._after_id is not None:
+            try:
+                self._widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._widget = None
+        self._after_id = None
+
+
+def get_options_registry():
+    """
+    Returns the OptionsRegistry shared by the whole process. Created on first call.
+    :return:
+    """
+    global _registry
+    if _registry is None:
+        _registry = OptionsRegistry()
+    return _registry
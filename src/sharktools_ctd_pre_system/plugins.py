@@ -1,27 +1,328 @@
 from importlib.metadata import entry_points
+import logging
+import os
+import threading
+import time
 import uuid
 
+from .events import call_in_main_thread
 
-platform_info = None
-platform_info_exceptions = None
+logger = logging.getLogger(__file__)
 
-for discovered_plugin in entry_points(group='sharktools.platform_info'):
-    platform_info = discovered_plugin.load()
-    platform_info.exceptions = platform_info.exceptions
+ENTRY_POINT_GROUP = 'sharktools.platform_info'
+
+# Path to a scenario file. If set, the bundled fake plugin (fake_platform_info) is used instead of installed plugins.
+FAKE_PLATFORM_ENV_VARIABLE = 'SHARKTOOLS_FAKE_PLATFORM'
+
+# Seconds to wait for the platform database before giving up (see PlatformDataRequest)
+PLATFORM_DATA_TIMEOUT = 20.
+
+# Seconds a snapshot of the current platform data is used before a live fetch is needed (see PlatformDataCache)
+PLATFORM_DATA_TTL = 60.
+
+# Seconds between background refreshes of the current platform data (see start_polling)
+PLATFORM_POLL_INTERVAL = 20.
+
+# Plugins are discovered on first use (see discover). Access them as plugins.platform_info and
+# plugins.platform_info_exceptions.
+_discovered = False
+_platform_info = None
+_platform_info_exceptions = None
+_discover_lock = threading.Lock()
+
+_platform_data_cache = None
+_polling_enabled = True
+
+# Seconds spent discovering and importing the plugins. None until discovered.
+discovery_time = None
+
+
+def discover():
+    """
+    Finds and imports the platform_info plugin. Only done on the first call. The last discovered plugin is used, or
+    the fake plugin if the environment variable SHARKTOOLS_FAKE_PLATFORM is set.
+    :return: the plugin module or None
+    """
+    global _discovered, _platform_info, _platform_info_exceptions, discovery_time
+    if _discovered:
+        return _platform_info
+    with _discover_lock:
+        if _discovered:
+            return _platform_info
+        t0 = time.perf_counter()
+        if os.environ.get(FAKE_PLATFORM_ENV_VARIABLE):
+            from . import fake_platform_info
+            fake_platform_info.load_scenario(os.environ[FAKE_PLATFORM_ENV_VARIABLE])
+            discovered_plugins = []
+            _platform_info = fake_platform_info
+            _platform_info_exceptions = fake_platform_info.exceptions
+        else:
+            discovered_plugins = entry_points(group=ENTRY_POINT_GROUP)
+        for discovered_plugin in discovered_plugins:
+            try:
+                _platform_info = discovered_plugin.load()
+            except Exception:
+                logger.exception(f'Could not load platform_info plugin {discovered_plugin.name}')
+                continue
+            _platform_info_exceptions = getattr(_platform_info, 'exceptions', None)
+        discovery_time = time.perf_counter() - t0
+        logger.info(f'Discovered platform_info plugin {getattr(_platform_info, "__name__", None)} '
+                    f'in {discovery_time * 1000:.1f} ms')
+        _discovered = True
+    return _platform_info
+
+
+def set_platform_info(platform_info):
+    """
+    Uses the given plugin module (e.g. fake_platform_info) instead of the discovered one.
+    :return:
+    """
+    global _discovered, _platform_info, _platform_info_exceptions
+    with _discover_lock:
+        _platform_info = platform_info
+        _platform_info_exceptions = getattr(platform_info, 'exceptions', None)
+        _discovered = True
+    if _platform_data_cache is not None:
+        _platform_data_cache.clear()
+
+
+def __getattr__(name):
+    if name == 'platform_info':
+        return discover()
+    if name == 'platform_info_exceptions':
+        discover()
+        return _platform_info_exceptions
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_platform_info(**kwargs) -> dict:
     data = dict(platform_name='platform')
+    platform_info = discover()
     if platform_info:
         data.update(platform_info.get_platform_info(**kwargs))
     return data
 
 
-def get_current_platform_data(**kwargs) -> dict:
+def _new_platform_data(current_data=None) -> dict:
     data = dict(
         event_id=str(uuid.uuid4()),
         parent_event_id=str(uuid.uuid4()),
     )
-    if platform_info:
-        data.update(platform_info.get_current_data(**kwargs))
+    if current_data:
+        data.update(current_data)
     return data
+
+
+def get_current_platform_data(**kwargs) -> dict:
+    platform_info = discover()
+    if not platform_info:
+        return _new_platform_data()
+    current_data = platform_info.get_current_data(**kwargs)
+    get_platform_data_cache().put(current_data, **kwargs)
+    return _new_platform_data(current_data)
+
+
+def get_cached_platform_data(**kwargs):
+    """
+    Returns the current platform data from the latest fetch with the same arguments (made by a call to
+    get_current_platform_data or by the poller) if it is not older than PLATFORM_DATA_TTL seconds. New event ids are
+    generated as in get_current_platform_data.
+    :return: dict or None
+    """
+    current_data = get_platform_data_cache().get(**kwargs)
+    if current_data is None:
+        return None
+    return _new_platform_data(current_data)
+
+
+class PlatformDataCache:
+    """
+    Holds the latest data returned by the platform_info plugin together with the arguments and time of the fetch.
+    The poller (start_polling) refreshes it in a background thread every <interval> seconds.
+    """
+
+    def __init__(self, ttl=PLATFORM_DATA_TTL, interval=PLATFORM_POLL_INTERVAL):
+        self.ttl = ttl
+        self.interval = interval
+        self.nr_polls = 0
+        self._kwargs = {}
+        self._data = None
+        self._time = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def age(self):
+        if self._time is None:
+            return None
+        return time.monotonic() - self._time
+
+    def put(self, data, **kwargs):
+        with self._lock:
+            self._data = data
+            self._kwargs = kwargs
+            self._time = time.monotonic()
+
+    def get(self, **kwargs):
+        with self._lock:
+            if self._data is None or kwargs != self._kwargs or time.monotonic() - self._time > self.ttl:
+                return None
+            return dict(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data = None
+            self._time = None
+
+    @property
+    def polling(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start_polling(self, **kwargs):
+        """
+        Refreshes the data with the given arguments every <interval> seconds. If already polling only the arguments
+        are changed.
+        :return:
+        """
+        with self._lock:
+            if kwargs != self._kwargs:
+                self._data = None
+                self._time = None
+            self._kwargs = kwargs
+        if self.polling:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, args=(self._stop,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_polling(self):
+        self._stop.set()
+        self._thread = None
+
+    def _poll(self, stop):
+        while not stop.is_set():
+            platform_info = discover()
+            if not platform_info:
+                return
+            with self._lock:
+                kwargs = self._kwargs
+            try:
+                data = platform_info.get_current_data(**kwargs)
+            except Exception as e:
+                logger.debug(f'Could not refresh platform data: {e}')
+            else:
+                if not stop.is_set():
+                    self.put(data, **kwargs)
+                    self.nr_polls += 1
+            stop.wait(self.interval)
+
+
+def get_platform_data_cache():
+    """
+    Returns the PlatformDataCache shared by the whole process. Created on first call.
+    :return:
+    """
+    global _platform_data_cache
+    if _platform_data_cache is None:
+        _platform_data_cache = PlatformDataCache()
+    return _platform_data_cache
+
+
+def start_polling(**kwargs):
+    """
+    Starts refreshing the current platform data in the background (see PlatformDataCache.start_polling). Nothing is
+    done if there is no platform_info plugin or if polling is disabled (see enable_polling).
+    :return:
+    """
+    if not _polling_enabled or not discover():
+        return
+    get_platform_data_cache().start_polling(**kwargs)
+
+
+def stop_polling():
+    if _platform_data_cache is not None:
+        _platform_data_cache.stop_polling()
+
+
+def enable_polling(enable=True):
+    """
+    Allows or prevents start_polling from starting the poller. Disabling also stops a running poller.
+    :return:
+    """
+    global _polling_enabled
+    _polling_enabled = enable
+    if not enable:
+        stop_polling()
+
+
+def is_polling_enabled():
+    return _polling_enabled
+
+
+class PlatformDataTimeout(Exception):
+    def __init__(self, timeout):
+        super().__init__(f'No answer from the platform within {timeout:g} seconds')
+        self.timeout = timeout
+
+
+class PlatformDataRequest:
+    """
+    Calls get_current_platform_data(**kwargs) in a worker thread. When the data arrives on_done(data) is called in
+    the Tk thread (see events.call_in_main_thread). on_error(exception) is called instead if the call fails or has
+    not returned within <timeout> seconds (PlatformDataTimeout). After cancel neither is called. A call that is
+    cancelled or timed out is left to finish in the background and its result is dropped.
+    """
+
+    def __init__(self, on_done, on_error, timeout=PLATFORM_DATA_TIMEOUT, **kwargs):
+        self.on_done = on_done
+        self.on_error = on_error
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.start_time = None
+        self._finished = False
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def active(self):
+        return self.start_time is not None and not self._finished
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.
+        return time.monotonic() - self.start_time
+
+    def start(self):
+        self.start_time = time.monotonic()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._finish, args=(self.on_error,
+                                                                            PlatformDataTimeout(self.timeout)))
+            self._timer.daemon = True
+            self._timer.start()
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        self._finish(None, None)
+
+    def _run(self):
+        try:
+            data = get_current_platform_data(**self.kwargs)
+        except Exception as e:
+            self._finish(self.on_error, e)
+            return
+        self._finish(self.on_done, data)
+
+    def _finish(self, callback, arg):
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        if self._timer is not None:
+            self._timer.cancel()
+        if callback is not None:
+            call_in_main_thread(callback, arg)
@@ -0,0 +1,154 @@
+"""
+Replays an event journal (see events.start_journal) into the event bus and measures the time spent in the handlers.
+
+Record a session by setting the environment variable SHARKTOOLS_EVENT_JOURNAL to a file path before starting
+SHARKtools. Replay it with:
+
+    python -m sharktools_ctd_pre_system.replay <journal> [--latency 0.05] [--realtime] [--no-frames]
+
+The station frames are built in a withdrawn Tk root with a StubController, so no ctd_pre_system config or data
+directories (and no visible window) are needed. Tk still needs a display. With --no-frames no frames are built and
+the events are posted to the bus alone (only handlers subscribed without frames are run), which works without a
+display. replay() itself never needs Tk.
+"""
+import argparse
+import collections
+import json
+import time
+
+from sharktools_ctd_pre_system import events
+
+
+class StubController:
+    """
+    Stands in for ctd_pre_system.controller.Controller. Every method returns a configured value (None by default,
+    empty list for get_*_list) after sleeping <latency> seconds to emulate server access. Calls are counted.
+    """
+
+    def __init__(self, latency=0., **return_values):
+        self.latency = latency
+        self.return_values = return_values
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            self.calls[name] += 1
+            if self.latency:
+                time.sleep(self.latency)
+            if name in self.return_values:
+                return self.return_values[name]
+            if name.startswith('get_') and name.endswith('_list'):
+                return []
+            return None
+        return method
+
+
+def read_journal(path):
+    """
+    Yields the records in the journal. A truncated last line (e.g. after a crash) is ignored.
+    """
+    with open(path, encoding='utf-8') as fid:
+        for line in fid:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def replay(path, realtime=False, include_nested=False, on_event=None):
+    """
+    Posts the events in the journal. Events posted by handlers (nested events) are by default left out since they
+    are posted again by the replayed handlers. Events that could not be serialised when recorded are skipped.
+    on_event is called (without arguments) after every posted event, e.g. to let Tk run scheduled callbacks.
+    :return: dict with event_type -> dict(count, total_time, max_time) (seconds)
+    """
+    stats = collections.defaultdict(lambda: dict(count=0, total_time=0., max_time=0.))
+    previous_time = None
+    for record in read_journal(path):
+        if record.get('x'):
+            continue
+        if record.get('n', 1) > 1 and not include_nested:
+            continue
+        if realtime and previous_time is not None:
+            time.sleep(max(0., record['t'] - previous_time))
+        previous_time = record['t']
+
+        t0 = time.perf_counter()
+        events.post_event(record['e'], record.get('d'), **record.get('k', {}))
+        if on_event:
+            on_event()
+        duration = time.perf_counter() - t0
+
+        info = stats[record['e']]
+        info['count'] += 1
+        info['total_time'] += duration
+        info['max_time'] = max(info['max_time'], duration)
+    return dict(stats)
+
+
+def get_replay_report(stats):
+    rows = sorted(stats.items(), key=lambda item: item[1]['total_time'], reverse=True)
+    lines = [f'{"count":>7} {"total [ms]":>11} {"max [ms]":>10}  event_type']
+    for event_type, info in rows:
+        lines.append(f'{info["count"]:>7} {info["total_time"] * 1000:>11.1f} {info["max_time"] * 1000:>10.1f}  '
+                     f'{event_type}')
+    return '\n'.join(lines)
+
+
+def build_station_frames(controller):
+    """
+    Builds FrameManageCTDcastsStation in a withdrawn Tk root. Needs a display.
+    :return: root, frame
+    """
+    import tkinter as tk
+    from sharktools_ctd_pre_system.gui import frames
+
+    root = tk.Tk()
+    root.withdraw()
+    frame = frames.FrameManageCTDcastsStation(root, controller)
+    frame.grid(row=0, column=0)
+    root.update()
+    return root, frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay an event journal from SHARKtools_pre_system_Svea')
+    parser.add_argument('journal', help='Path to the journal')
+    parser.add_argument('--latency', type=float, default=0., help='Seconds each controller call takes')
+    parser.add_argument('--realtime', action='store_true', help='Keep the time between events')
+    parser.add_argument('--include-nested', action='store_true', help='Also post events posted by handlers')
+    parser.add_argument('--no-frames', action='store_true', help='Post to the event bus without building the '
+                                                                 'frames (no display needed)')
+    args = parser.parse_args()
+
+    controller = StubController(latency=args.latency)
+    root = None
+    if not args.no_frames:
+        root, frame = build_station_frames(controller)
+    events.enable_profiling()
+    stats = replay(args.journal,
+                   realtime=args.realtime,
+                   include_nested=args.include_nested,
+                   on_event=root.update if root else None)
+    if root:
+        # Let pending debounced handlers run
+        time.sleep(1)
+        root.update()
+
+    print(get_replay_report(stats))
+    events.print_profile()
+    if root:
+        print('Controller calls:')
+        for name, nr in controller.calls.most_common():
+            print(f'{nr:>7}  {name}')
+        root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,39 +1,269 @@
 
 import yaml
 from yaml.loader import SafeLoader
+import atexit
+import contextlib
+import datetime
+import logging
+import os
 import pathlib
 import json
+import sqlite3
+import sys
+import threading
+import types
+import weakref
+
+from .events import batch
+from .events import EVENT_TYPES
+from .events import SubscriptionScope
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+from .options import get_options_registry
+
+logger = logging.getLogger(__file__)
+
+# Seconds to collect changes in Saves before writing them to file. 0 writes on every change.
+WRITE_DELAY = 2.
+
+# Milliseconds between snapshots of the form taken by Snapshotter
+SNAPSHOT_INTERVAL = 5000
+
+# Tk events that mark the form as changed since the last snapshot (see Snapshotter)
+SNAPSHOT_INPUT_EVENTS = ['<KeyRelease>', '<ButtonRelease>', '<<ComboboxSelected>>']
+
+# Number of records in the change log of Saves that triggers a compaction into a new snapshot
+COMPACT_AFTER = 200
+
+SAVES_BACKEND_ENV_VARIABLE = 'SHARKTOOLS_SAVES_BACKEND'
+
+# Version of the values written by SaveComponents. Values with another version are ignored when loading.
+# 2: values stored without codec tag
+COMPONENT_SCHEMA_VERSION = 2
+
+# Component name of a value in SqliteSaves that is not a dict
+SQLITE_SINGLE_VALUE = ''
+
+DEFAULT_USER_PATH = pathlib.Path(pathlib.Path(__file__).parent, 'default.user')
+DEFAULTS_DIRECTORY = pathlib.Path(pathlib.Path(__file__).parent, 'defaults')
+
+# Stores shared by the whole process. Created on first use (see get_saves, get_cast_history and get_defaults).
+_saves = None
+_cast_history = None
+_defaults = dict()
+_default_user = None
+_resolved_selections = None
+
+# Caches validated on modification time (see _get_default_users_index and _load_yaml)
+_default_users_index = None
+_yaml_cache = dict()
+
+_all_saves = weakref.WeakSet()
+
+
+def _lock_file(fid):
+    """
+    Takes an exclusive advisory lock on the open file. Blocks until the lock is taken.
+    :return:
+    """
+    if sys.platform == 'win32':
+        fid.seek(0)
+        while True:
+            try:
+                msvcrt.locking(fid.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after 10 seconds
+                continue
+    fcntl.flock(fid.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(fid):
+    if sys.platform == 'win32':
+        fid.seek(0)
+        msvcrt.locking(fid.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(fid.fileno(), fcntl.LOCK_UN)
+
+
+def _get_default_users_index():
+    """
+    Returns a dict user -> path to the yaml file in the defaults directory. The directory is only scanned again
+    if its modification time has changed.
+    :return:
+    """
+    global _default_users_index
+    mtime = DEFAULTS_DIRECTORY.stat().st_mtime_ns
+    if _default_users_index is None or _default_users_index[0] != mtime:
+        index = {}
+        for path in DEFAULTS_DIRECTORY.iterdir():
+            if path.suffix != '.yaml':
+                continue
+            index[path.stem] = path
+        _default_users_index = (mtime, index)
+    return _default_users_index[1]
 
 
 def get_default_users():
-    users = []
-    for path in pathlib.Path(pathlib.Path(__file__).parent, 'defaults').iterdir():
-        if path.suffix != '.yaml':
-            continue
-        users.append(path.stem)
-    return sorted(users)
+    return sorted(_get_default_users_index())
 
 
 def get_default_user_file_path(user):
-    users = get_default_users()
-    if user not in users:
-        return False
-    return pathlib.Path(pathlib.Path(__file__).parent, 'defaults', f'{user}.yaml')
+    return _get_default_users_index().get(user, False)
+
+
+def _load_yaml(path):
+    """
+    Returns the content of the yaml file. The file is only parsed again if its modification time has changed.
+    :return:
+    """
+    mtime = path.stat().st_mtime_ns
+    cached = _yaml_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as fid:
+            cached = (mtime, yaml.load(fid, Loader=SafeLoader) or {})
+        _yaml_cache[path] = cached
+    return cached[1]
+
+
+def get_default_user():
+    """
+    Returns the name of the current default user (as stored in default.user). The file is read once.
+    :return:
+    """
+    global _default_user
+    if _default_user is None:
+        _default_user = ''
+        if DEFAULT_USER_PATH.exists():
+            with open(DEFAULT_USER_PATH) as fid:
+                _default_user = fid.read().strip()
+    return _default_user or 'default'
+
+
+def set_default_user(user):
+    """
+    Sets and stores the default user. The file is only written if the user has changed.
+    :return:
+    """
+    global _default_user
+    if not user or user == _default_user:
+        return
+    with open(DEFAULT_USER_PATH, 'w') as fid:
+        fid.write(user)
+    _default_user = user
+
+
+def get_saves():
+    """
+    Returns the Saves shared by the whole process. It is created (and the file read) on first call.
+    Set the environment variable SHARKTOOLS_SAVES_BACKEND to "sqlite" to use SqliteSaves instead.
+    :return:
+    """
+    global _saves
+    if _saves is None:
+        if os.environ.get(SAVES_BACKEND_ENV_VARIABLE, '').lower() == 'sqlite':
+            _saves = get_cast_history()
+        else:
+            _saves = Saves()
+    return _saves
+
+
+def get_cast_history():
+    """
+    Returns the SqliteSaves holding the cast history shared by the whole process. Created on first call.
+    :return:
+    """
+    global _cast_history
+    if _cast_history is None:
+        _cast_history = SqliteSaves()
+    return _cast_history
+
+
+def get_defaults(user=None):
+    """
+    Returns the Defaults for the given user shared by the whole process. If no user is given the current default
+    user is used. A given user is stored as the new default user.
+    :return:
+    """
+    if user:
+        if not get_default_user_file_path(user):
+            raise Exception('Invalid user default path')
+        set_default_user(user)
+    else:
+        user = get_default_user()
+    defaults = _defaults.get(user)
+    if defaults is None or defaults.is_outdated():
+        defaults = _defaults[user] = Defaults(user)
+    return defaults
+
+
+def resolve_selection(saved, defaults):
+    """
+    Merges a saved selection with the user defaults. A value in defaults has precedence over the saved value.
+    :return: read-only mapping with name -> value
+    """
+    resolved = {name: value for name, value in saved.items() if value is not None}
+    resolved.update((name, value) for name, value in defaults.items() if value is not None)
+    return types.MappingProxyType(resolved)
+
+
+class ResolvedSelections:
+    """
+    Options, user defaults and saved selections merged into read-only lookups. The selection for a saves key is
+    resolved on first request and then reused. Use get_resolved_selections to get an up to date instance.
+    """
+
+    def __init__(self, saves, defaults):
+        self.saves = saves
+        self.defaults = defaults
+        self.options = types.MappingProxyType(get_options_registry().data)
+        self._version = saves.version
+        self._selections = {}
+
+    def is_outdated(self, saves, defaults):
+        return saves is not self.saves or saves.version != self._version or defaults is not self.defaults
+
+    def get(self, key):
+        """
+        Returns the selection stored under key resolved with the user defaults.
+        :return:
+        """
+        selection = self._selections.get(key)
+        if selection is None:
+            saved = self.saves.get(key)
+            if not isinstance(saved, dict):
+                saved = {}
+            selection = self._selections[key] = resolve_selection(saved, self.defaults.data)
+        return selection
+
+
+def get_resolved_selections(user=None):
+    """
+    Returns the ResolvedSelections for the given (or current default) user. Rebuilt when the user, the user
+    defaults file or the saved selections have changed.
+    :return:
+    """
+    global _resolved_selections
+    saves = get_saves()
+    defaults = get_defaults(user)
+    if _resolved_selections is None or _resolved_selections.is_outdated(saves, defaults):
+        _resolved_selections = ResolvedSelections(saves, defaults)
+    return _resolved_selections
 
 
 class Defaults:
 
     def __init__(self, user=None):
         self._this_directory = pathlib.Path(__file__).parent
-        self._default_user_path = pathlib.Path(self._this_directory, 'default.user')
+        self._default_user_path = DEFAULT_USER_PATH
 
         self.file_path = None
+        self._mtime = None
 
         user = user or self.user
-        # if not user:
-        #     user = self._load_default_user()
-        # if not user:
-        #     user = 'default'
 
         self.file_path = get_default_user_file_path(user)
         if not self.file_path:
@@ -50,55 +280,261 @@ class Defaults:
         :return:
         """
         if self.file_path and self.file_path.exists():
-            with open(self.file_path) as fid:
-                self.data = yaml.load(fid, Loader=SafeLoader)
+            self._mtime = self.file_path.stat().st_mtime_ns
+            self.data = _load_yaml(self.file_path)
+
+    def is_outdated(self):
+        """
+        Returns True if the yaml file has been changed (or removed) since it was loaded.
+        :return:
+        """
+        try:
+            return self.file_path.stat().st_mtime_ns != self._mtime
+        except OSError:
+            return True
 
     @property
     def user(self):
-        return self._load_default_user() or 'default'
+        return get_default_user()
 
     def get(self, key, default=None):
         return self.data.get(key, default)
 
     def _save_default_user(self, user):
-        if not user:
-            return
-        with open(self._default_user_path, 'w') as fid:
-            fid.write(user)
+        set_default_user(user)
 
     def _load_default_user(self):
-        if not self._default_user_path.exists():
-            return
-        with open(self._default_user_path) as fid:
-            return fid.read().strip()
+        return get_default_user()
 
 
 class Saves:
+    """
+    Key/value store saved in the users home directory. The store is made up of a json snapshot and an append-only
+    change log next to it (one json record per line: {"k": key, "v": value} or, for a single item of a dict value,
+    {"k": key, "c": component, "v": value}). Saving a change appends a record to
+    the log. When the log has grown to <COMPACT_AFTER> records it is compacted: a new snapshot is written to a
+    temporary file that atomically replaces the old one, and the log is emptied. Loading reads the snapshot and
+    replays the log, ignoring a record cut short by a crash, so the last consistent state is recovered.
+
+    Changes are written behind: set marks the key as dirty and the log is written by a background timer at most
+    <write_delay> seconds later, so a burst of changes results in one write. Call flush (or flush_all) to write
+    pending changes directly.
 
-    def __init__(self):
-        self.file_path = pathlib.Path.home() / 'sharktools' / 'sharktools_ctd_pre_system.json'
+    Several processes can share the store. Files are only read and written while holding a lock on a lock file next
+    to the snapshot. Before appending, records appended by other processes since the last read are applied, except
+    where this instance has pending changes. The last written value wins per key (or per component), not per file.
+    """
+
+    def __init__(self, write_delay=WRITE_DELAY, file_path=None):
+        self.file_path = file_path or pathlib.Path.home() / 'sharktools' / 'sharktools_ctd_pre_system.json'
         self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.file_path.with_suffix('.log')
+        self.lock_path = self.file_path.with_suffix('.lock')
 
         self.data = {}
 
+        self.write_delay = write_delay
+        self.nr_writes = 0
+        # Incremented on every change. Used to tell if ResolvedSelections are outdated.
+        self.version = 0
+        self._nr_log_records = 0
+        # Position in the change log read so far and the snapshot it belongs to. Used to read changes from others.
+        self._log_position = 0
+        self._snapshot_id = None
+        self._dirty_keys = set()
+        self._timer = None
+        self._lock = threading.RLock()
+
         self._load()
 
+        _all_saves.add(self)
+
+    def _file_lock(self):
+        return _FileLock(self.lock_path)
+
+    def _get_snapshot_id(self):
+        try:
+            stat = self.file_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
     def _load(self):
         """
-        Loads dict from json
+        Loads the snapshot and replays the change log
         :return:
         """
+        with self._lock, self._file_lock():
+            data, complete = self._read()
+            self.data = data
+            if not complete:
+                self._compact()
+
+    def _read(self):
+        """
+        Reads the snapshot and the whole change log into a new dict. Call with the file lock taken.
+        :return: (data, False if the change log ends with a broken record)
+        """
+        data = {}
+        self._snapshot_id = self._get_snapshot_id()
         if self.file_path.exists():
-            with open(self.file_path) as fid:
-                self.data = json.load(fid)
+            try:
+                with open(self.file_path) as fid:
+                    data = json.load(fid)
+            except ValueError:
+                logger.error(f'Could not read {self.file_path}. Starting from the change log only.')
+                data = {}
+        self._log_position = 0
+        self._nr_log_records = 0
+        return self._read_log(data)
+
+    def _read_log(self, data):
+        """
+        Applies the records in the change log after the position read so far. data is not changed: the records are
+        applied to a copy (dict values changed by a record are copied as well) so that readers in other threads never
+        see a dict being changed. Call with the file lock taken.
+        :return: (new data, False if the change log ends with a broken record)
+        """
+        data = dict(data)
+        if not self.log_path.exists():
+            return data, True
+        complete = True
+        # Keys with a dict value that is already a copy
+        copied = set()
+        with open(self.log_path, 'rb') as fid:
+            fid.seek(self._log_position)
+            for line in fid:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('Record not terminated')
+                    record = json.loads(line)
+                    key = record['k']
+                    if 'c' in record:
+                        current = data.get(key)
+                        if not isinstance(current, dict):
+                            current = {}
+                        elif key not in copied:
+                            current = dict(current)
+                        current[record['c']] = record['v']
+                        data[key] = current
+                    else:
+                        data[key] = record['v']
+                    copied.add(key)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # Record cut short by a crash. Nothing after it can be trusted.
+                    complete = False
+                    break
+                self._log_position += len(line)
+                self._nr_log_records += 1
+        return data, complete
+
+    def _merge(self):
+        """
+        Applies changes written by other processes. Pending changes in this instance are kept. The merged store is
+        built in a new dict that replaces self.data. Call with the lock and the file lock taken.
+        :return:
+        """
+        pending = {}
+        for item in self._dirty_keys:
+            if type(item) == tuple:
+                key, component = item
+                pending[item] = _get_component(self.data, key, component)
+            else:
+                pending[item] = self.data.get(item)
+        if self._get_snapshot_id() != self._snapshot_id:
+            # The store has been compacted by another process
+            data, complete = self._read()
+        else:
+            data, complete = self._read_log(self.data)
+        # Whole keys first, then single components
+        for item in sorted(pending, key=lambda item: (type(item) == tuple, str(item))):
+            if type(item) == tuple:
+                key, component = item
+                current = data.get(key)
+                current = dict(current) if isinstance(current, dict) else {}
+                current[component] = pending[item]
+                data[key] = current
+            else:
+                data[item] = pending[item]
+        self.data = data
+        self.version += 1
+        if not complete:
+            self._compact()
 
     def _save(self):
         """
-        Writes information to json file.
+        Appends the dirty keys to the change log and compacts the store if the log is long.
+        :return:
+        """
+        with self._lock, self._file_lock():
+            self._merge()
+            lines = []
+            # Whole keys first, then single components
+            for item in sorted(self._dirty_keys, key=lambda item: (type(item) == tuple, str(item))):
+                if type(item) == tuple:
+                    key, component = item
+                    record = dict(k=key, c=component, v=_get_component(self.data, key, component))
+                else:
+                    record = dict(k=item, v=self.data.get(item))
+                lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+            data = ''.join(lines).encode('utf-8')
+            with open(self.log_path, 'ab') as fid:
+                fid.write(data)
+                fid.flush()
+                os.fsync(fid.fileno())
+            self._log_position += len(data)
+            self._dirty_keys.clear()
+            self._nr_log_records += len(lines)
+            self.nr_writes += 1
+            if self._nr_log_records >= COMPACT_AFTER:
+                self._compact()
+
+    def _compact(self):
+        """
+        Writes the whole store to a new snapshot (atomically replacing the old one) and empties the change log.
+        Call with the file lock taken.
+        :return:
+        """
+        with self._lock:
+            tmp_path = self.file_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as fid:
+                json.dump(self.data, fid, indent=4, sort_keys=True)
+                fid.flush()
+                os.fsync(fid.fileno())
+            os.replace(tmp_path, self.file_path)
+            with open(self.log_path, 'w'):
+                pass
+            self._snapshot_id = self._get_snapshot_id()
+            self._log_position = 0
+            self._nr_log_records = 0
+
+    def _set_dirty(self, *items):
+        with self._lock:
+            self._dirty_keys.update(items)
+            if not self.write_delay:
+                self._save()
+                return
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Writes pending changes to file.
         :return:
         """
-        with open(self.file_path, 'w') as fid:
-            json.dump(self.data, fid, indent=4, sort_keys=True)
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty_keys:
+                self._save()
+
+    @property
+    def dirty(self):
+        return bool(self._dirty_keys)
 
     def set(self, key, value):
         if isinstance(value, pathlib.Path):
@@ -110,18 +546,379 @@ class Saves:
                     v = str(v)
                 new_value[k] = v
             value = new_value
-        self.data[key] = value
-        self._save()
+        with self._lock:
+            self.data[key] = value
+            self.version += 1
+            # The whole value is written, so pending single components of it are not
+            self._dirty_keys = {item for item in self._dirty_keys if type(item) != tuple or item[0] != key}
+            self._set_dirty(key)
+
+    def update(self, key, values):
+        """
+        Updates single items in the dict stored under key. Only the given items are written.
+        :return:
+        """
+        values = {k: str(v) if isinstance(v, pathlib.Path) else v for k, v in values.items()}
+        with self._lock:
+            self.version += 1
+            current = self.data.get(key)
+            if current is None:
+                current = {}
+            elif not isinstance(current, dict):
+                self.data[key] = values
+                self._set_dirty(key)
+                return
+            # A new dict, so a dict returned by get is never changed
+            self.data[key] = {**current, **values}
+            self._set_dirty(*[(key, k) for k in values])
 
     def get(self, key, default=''):
-        return self.data.get(key, default)
+        with self._lock:
+            return self.data.get(key, default)
+
+
+def _get_component(data, key, component):
+    value = data.get(key)
+    if not isinstance(value, dict):
+        return None
+    return value.get(component)
+
+
+class _FileLock:
+    """
+    Context manager holding an exclusive lock on the given lock file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fid = None
+
+    def __enter__(self):
+        self._fid = open(self.path, 'a+b')
+        _lock_file(self._fid)
+        return self
+
+    def __exit__(self, *args):
+        try:
+            _unlock_file(self._fid)
+        finally:
+            self._fid.close()
+            self._fid = None
+
+
+class SqliteSaves:
+    """
+    Alternative to Saves stored in a sqlite database in the users home directory. Selections are stored with one
+    row per (key, component) so single values are looked up without loading the whole store. The database also
+    holds the cast history: one row for every launch of Seasave (see add_cast and get_casts).
+    Has the same interface as Saves (get, set, flush, dirty). Every set is committed directly.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or pathlib.Path.home() / 'sharktools' / 'sharktools_ctd_pre_system.sqlite'
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.nr_writes = 0
+        self.version = 0
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(str(self.file_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS selections ('
+                                     'key TEXT NOT NULL, '
+                                     'component TEXT NOT NULL, '
+                                     'value TEXT, '
+                                     'PRIMARY KEY (key, component))')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS casts ('
+                                     'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                     'time TEXT NOT NULL, '
+                                     'instrument TEXT, '
+                                     'cruise TEXT, '
+                                     'series TEXT, '
+                                     'station TEXT, '
+                                     'metadata TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS casts_station ON casts (station)')
+
+        _all_saves.add(self)
+
+    @property
+    def dirty(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def set(self, key, value):
+        """
+        Replaces all values stored under key. A dict is stored with one row per item, other values in one row.
+        :return:
+        """
+        if isinstance(value, dict):
+            rows = [(key, str(k), _to_json(v)) for k, v in value.items()]
+        else:
+            rows = [(key, SQLITE_SINGLE_VALUE, _to_json(value))]
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM selections WHERE key = ?', (key,))
+            self._connection.executemany('INSERT INTO selections (key, component, value) VALUES (?, ?, ?)', rows)
+        self.nr_writes += 1
+        self.version += 1
+
+    def update(self, key, values):
+        """
+        Updates single items in the dict stored under key. Only the given items are written.
+        :return:
+        """
+        rows = [(key, str(k), _to_json(v)) for k, v in values.items()]
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM selections WHERE key = ? AND component = ?',
+                                     (key, SQLITE_SINGLE_VALUE))
+            self._connection.executemany('INSERT OR REPLACE INTO selections (key, component, value) '
+                                         'VALUES (?, ?, ?)', rows)
+        self.nr_writes += 1
+        self.version += 1
+
+    def get(self, key, default=''):
+        with self._lock:
+            rows = self._connection.execute('SELECT component, value FROM selections WHERE key = ?',
+                                            (key,)).fetchall()
+        if not rows:
+            return default
+        if len(rows) == 1 and rows[0][0] == SQLITE_SINGLE_VALUE:
+            return json.loads(rows[0][1])
+        return {component: json.loads(value) for component, value in rows}
+
+    def get_value(self, key, component, default=None):
+        """
+        Returns the value of a single component stored under key.
+        :return:
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM selections WHERE key = ? AND component = ?',
+                                           (key, component)).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def add_cast(self, instrument='', cruise='', series='', station='', metadata=None):
+        """
+        Adds a launch of Seasave to the cast history.
+        :return:
+        """
+        row = (datetime.datetime.now().isoformat(timespec='seconds'), instrument, cruise, series, station,
+               _to_json(metadata or {}))
+        with self._lock, self._connection:
+            self._connection.execute('INSERT INTO casts (time, instrument, cruise, series, station, metadata) '
+                                     'VALUES (?, ?, ?, ?, ?, ?)', row)
+
+    def get_casts(self, station=None, cruise=None, limit=None):
+        """
+        Returns casts from the cast history (latest first) as a list of dicts, optionally filtered on station and
+        cruise.
+        :return:
+        """
+        query = 'SELECT time, instrument, cruise, series, station, metadata FROM casts'
+        conditions = []
+        args = []
+        if station is not None:
+            conditions.append('station = ?')
+            args.append(station)
+        if cruise is not None:
+            conditions.append('cruise = ?')
+            args.append(cruise)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id DESC'
+        if limit:
+            query += ' LIMIT ?'
+            args.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, args).fetchall()
+        keys = ['time', 'instrument', 'cruise', 'series', 'station', 'metadata']
+        casts = [dict(zip(keys, row)) for row in rows]
+        for cast in casts:
+            cast['metadata'] = json.loads(cast['metadata'])
+        return casts
+
+    def get_latest_cast(self, station):
+        """
+        Returns the latest cast at the given station or None.
+        :return:
+        """
+        casts = self.get_casts(station=station, limit=1)
+        if not casts:
+            return None
+        return casts[0]
+
+
+class Snapshotter:
+    """
+    Takes a snapshot of the form every <interval> ms using widget.after by calling save (e.g. the save_selection of
+    the page). A snapshot is only taken if the form may have changed since the last one: after user input in the
+    application (SNAPSHOT_INPUT_EVENTS) or after an event on the event bus. save_selection only passes changed values
+    to the store and the store writes the changes behind (see Saves), so state lost in a crash is at most
+    <interval> ms + WRITE_DELAY old. Must be started from the Tk thread.
+    """
+
+    def __init__(self, widget, save, interval=SNAPSHOT_INTERVAL):
+        self.widget = widget
+        self.save = save
+        self.interval = interval
+        self.nr_snapshots = 0
+        self.dirty = False
+        self._after_id = None
+        self._bound = False
+        self._subscriptions = SubscriptionScope()
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def start(self):
+        self.stop()
+        if not self._bound:
+            for sequence in SNAPSHOT_INPUT_EVENTS:
+                self.widget.bind_all(sequence, self.mark_dirty, add='+')
+            self._bound = True
+        for event_type in EVENT_TYPES:
+            self._subscriptions.subscribe(event_type, self.mark_dirty, after=True)
+        self._after_id = self.widget.after(self.interval, self._run)
+
+    def stop(self):
+        self._subscriptions.close()
+        if self._after_id is None:
+            return
+        try:
+            self.widget.after_cancel(self._after_id)
+        except Exception:
+            pass
+        self._after_id = None
+
+    def mark_dirty(self, *args, **kwargs):
+        self.dirty = True
+
+    def snapshot(self):
+        if not self.dirty:
+            return
+        # Cleared before saving so that changes made while saving are taken in the next snapshot
+        self.dirty = False
+        version = get_saves().version
+        try:
+            self.save()
+        except Exception:
+            self.dirty = True
+            logger.exception('Could not take snapshot of form')
+            return
+        if get_saves().version != version:
+            self.nr_snapshots += 1
+
+    def _run(self):
+        self.snapshot()
+        self._after_id = self.widget.after(self.interval, self._run)
+
+
+# SaveSelection objects (and their default user) whose load_selection is deferred to the end of restoring()
+_pending_loads = []
+# Functions to call when the selections have been restored (see after_restore)
+_after_restore = []
+_restoring_depth = 0
+
+
+@contextlib.contextmanager
+def restoring():
+    """
+    Restores the selections of all frames built inside the with-block in one pass. load_selection calls made in the
+    block are collected and run together when the outermost block exits: the resolved selections are looked up once
+    per user and the events posted by the components are posted once (see events.batch). Steps that need the
+    restored values are passed to after_restore.
+
+        with restoring():
+            self._create_frame()
+    """
+    global _restoring_depth
+    _restoring_depth += 1
+    try:
+        yield
+    finally:
+        _restoring_depth -= 1
+        if not _restoring_depth:
+            _restore_pending()
+
+
+def _restore_pending():
+    loads = list(_pending_loads)
+    _pending_loads.clear()
+    callbacks = list(_after_restore)
+    _after_restore.clear()
+    resolved = {}
+
+    def resolve(user):
+        if user not in resolved:
+            resolved[user] = get_resolved_selections(user)
+        return resolved[user]
+
+    with batch():
+        for obj, default_user in loads:
+            obj._load_selection(default_user, resolve)
+    for func in callbacks:
+        func()
+
+
+def after_restore(func):
+    """
+    Calls func when the selections have been restored: at the end of restoring() if inside the block, else directly.
+    :return:
+    """
+    if _restoring_depth:
+        _after_restore.append(func)
+        return
+    func()
+
+
+def _to_json(value):
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+
+_NOT_STORED = object()
+
+
+def _as_stored(value):
+    """
+    Returns value as it looks when read back from the store (tuples become lists and paths strings).
+    :return:
+    """
+    if isinstance(value, (tuple, list)):
+        return [_as_stored(v) for v in value]
+    if isinstance(value, pathlib.Path):
+        return str(value)
+    return value
+
+
+def flush_all():
+    """
+    Writes pending changes in all Saves to file.
+    :return:
+    """
+    for saves in list(_all_saves):
+        saves.flush()
+
+
+atexit.register(flush_all)
 
 
 class SaveSelection:
-    _saves = Saves()
-    _defaults = Defaults()
     _saves_id_key = ''
     _selections_to_store = []
+    _default_user = None
+
+    @property
+    def _saves(self):
+        return get_saves()
+
+    @property
+    def _defaults(self):
+        return get_defaults(self._default_user)
+
+    # Values of the selection as last loaded from or saved to the store. Used to only save changed values.
+    _stored_selection = None
 
     def save_selection(self):
         data = {}
@@ -137,70 +934,183 @@ class SaveSelection:
                     data[comp] = getattr(self, comp).get()
                 except:
                     pass
-        self._saves.set(self._saves_id_key, data)
+        stored = self._stored_selection or {}
+        changed = {name: value for name, value in data.items()
+                   if _as_stored(value) != stored.get(name, _NOT_STORED)}
+        if not changed:
+            return
+        self._saves.update(self._saves_id_key, changed)
+        self._stored_selection = dict(stored, **{name: _as_stored(value) for name, value in changed.items()})
 
     def load_selection(self, default_user=None, **kwargs):
+        if _restoring_depth:
+            _pending_loads.append((self, default_user))
+            return
+        self._load_selection(default_user)
+
+    def _load_selection(self, default_user=None, resolve=get_resolved_selections):
         data = self._saves.get(self._saves_id_key)
         if not data:
             return
+        self._stored_selection = dict(data)
         if default_user:
-            self._defaults = Defaults(user=default_user)
+            self._default_user = default_user
+        selection = resolve(self._default_user).get(self._saves_id_key)
         if type(self._selections_to_store) == dict:
-            for name, comp in self._selections_to_store.items():
-                try:
-                    value = self._defaults.get(name)
-                    if value is None:
-                        value = data.get(name, None)
-                        if value is None:
-                            continue
-                    comp.set(value)
-                except:
-                    pass
+            components = self._selections_to_store
         else:
-            for comp in self._selections_to_store:
+            components = {name: getattr(self, name) for name in self._selections_to_store}
+        # Events posted by the components while setting values are posted once when all values are set
+        with batch():
+            for name, comp in components.items():
+                if name not in selection:
+                    continue
                 try:
-                    value = self._defaults.get(self._saves_id_key)
-                    if value is None:
-                        value = data.get(comp, None)
-                        if value is None:
-                            continue
-                    getattr(self, comp).set(value)
+                    comp.set(selection[name])
                 except:
-                    raise
+                    pass
+
+
+def _encode_pair(value):
+    return [str(value[0]), str(value[1])]
+
+
+def _decode_pair(value):
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(value)
+    return tuple(value)
+
+
+def _encode_dict(value):
+    return dict(value or {})
+
+
+def _decode_dict(value):
+    if not isinstance(value, dict):
+        raise ValueError(value)
+    return value
+
+
+# Codecs for component values: tag -> (encode, decode). The encoded value must be json serialisable. decode raises
+# TypeError or ValueError for a value it can not decode.
+COMPONENT_CODECS = {
+    'str': (str, str),
+    'int': (int, int),
+    'pair': (_encode_pair, _decode_pair),
+    'dict': (_encode_dict, _decode_dict),
+}
+
+# Codec tag used for a component type (class name), for components whose get does not return a string. Other
+# components use the 'str' codec.
+COMPONENT_TYPE_CODECS = {
+    'LabelDoubleEntry': 'pair',
+    'CruiseLabelDoubleEntry': 'pair',
+    'VesselLabelDoubleEntry': 'pair',
+    'PositionEntries': 'pair',
+    'LabelCheckbox': 'int',
+    'SensorTable': 'dict',
+    'SensorTableOld': 'dict',
+}
+
+# Codec tag looked up for a component type (see get_component_codec)
+_component_type_codecs = dict()
+
+# Name under which SaveComponents stores COMPONENT_SCHEMA_VERSION
+SCHEMA_VERSION_KEY = '_v'
+
+
+def get_component_codec(comp):
+    """
+    Returns the codec tag for the component. Base classes are used if the type itself is not registered.
+    :return:
+    """
+    comp_type = type(comp)
+    tag = _component_type_codecs.get(comp_type)
+    if tag is None:
+        tag = 'str'
+        for cls in comp_type.__mro__:
+            if cls.__name__ in COMPONENT_TYPE_CODECS:
+                tag = COMPONENT_TYPE_CODECS[cls.__name__]
+                break
+        _component_type_codecs[comp_type] = tag
+    return tag
+
+
+def encode_component_value(tag, value):
+    """
+    Returns the value stored for a component. The codec is given by the component type, so only the encoded value
+    is stored.
+    :return:
+    """
+    return COMPONENT_CODECS[tag][0](value)
+
+
+def decode_component_value(tag, stored):
+    """
+    Returns the value from encode_component_value. Values that can not be decoded with the given codec (e.g. user
+    defaults given as strings) are returned as they are.
+    :return:
+    """
+    if tag == 'str':
+        return stored
+    try:
+        return COMPONENT_CODECS[tag][1](stored)
+    except (TypeError, ValueError):
+        return stored
 
 
 class SaveComponents:
+    """
+    Saves and loads the values of the added components under one key. Values are stored with the codec for the
+    component type (see encode_component_value) so they are loaded without parsing strings. The schema version is
+    stored with the values and saved values of another version are not loaded.
+    """
 
     def __init__(self, key):
-        self._saves = Saves()
-        self._defaults = Defaults()
         self._saves_id_key = key
-        self._components_to_store = set()
+        # component -> codec tag
+        self._components_to_store = {}
+        self._stored = {}
+
+    @property
+    def _saves(self):
+        return get_saves()
+
+    @property
+    def _defaults(self):
+        return get_defaults()
 
     def add_components(self, *args):
         for comp in args:
-            self._components_to_store.add(comp)
+            self._components_to_store[comp] = get_component_codec(comp)
 
     def save(self):
-        data = {}
-        for comp in self._components_to_store:
+        data = {SCHEMA_VERSION_KEY: COMPONENT_SCHEMA_VERSION}
+        for comp, tag in self._components_to_store.items():
             try:
-                data[comp._id] = str(comp.get())
-                # print(f'SAVING: {comp._id} - {data[comp._id]}')
+                data[comp._id] = encode_component_value(tag, comp.get())
             except:
                 pass
-        self._saves.set(self._saves_id_key, data)
+        changed = {key: value for key, value in data.items() if self._stored.get(key, _NOT_STORED) != value}
+        if not changed:
+            return
+        self._saves.update(self._saves_id_key, changed)
+        self._stored.update(changed)
 
     def load(self):
         data = self._saves.get(self._saves_id_key)
-        for comp in self._components_to_store:
-            try:
-                item = self._defaults.get(comp._id, None)
-                if item is None:
-                    item = data.get(comp._id, None)
-                if item is None:
+        self._stored = dict(data or {})
+        selection = get_resolved_selections().get(self._saves_id_key)
+        version = selection.get(SCHEMA_VERSION_KEY, COMPONENT_SCHEMA_VERSION)
+        if version != COMPONENT_SCHEMA_VERSION:
+            logger.warning(f'Ignoring saved {self._saves_id_key} with schema version {version}')
+            selection = get_defaults().data
+        with batch():
+            for comp, tag in self._components_to_store.items():
+                if comp._id not in selection:
                     continue
-                comp.set(item)
-            except:
-                pass
+                try:
+                    comp.set(decode_component_value(tag, selection[comp._id]))
+                except:
+                    pass
 
@@ -0,0 +1,89 @@
+import gc
+import tracemalloc
+import unittest
+import weakref
+
+from sharktools_ctd_pre_system import events
+
+
+class _StationFrame:
+    """
+    Headless stand-in for a cast management frame: subscribes bound methods and holds some data.
+    """
+
+    def __init__(self):
+        self.data = [0] * 1000
+        self.nr_calls = 0
+        events.subscribe('select_instrument', self._on_select_instrument)
+        events.subscribe('confirm_sensors', self._on_confirm_sensors)
+
+    def _on_select_instrument(self, data, **kwargs):
+        self.nr_calls += 1
+
+    def _on_confirm_sensors(self, data, **kwargs):
+        self.nr_calls += 1
+
+
+class _TransectFrame(_StationFrame):
+
+    def __init__(self):
+        super().__init__()
+        events.subscribe('select_instrument', self._on_select_transect_instrument)
+
+    def _on_select_transect_instrument(self, data, **kwargs):
+        self.nr_calls += 1
+
+
+class TestSwitchInstruments(unittest.TestCase):
+
+    def tearDown(self):
+        for func in [_StationFrame._on_select_instrument, _TransectFrame._on_select_transect_instrument]:
+            events.unsubscribe('select_instrument', func)
+        events.unsubscribe('confirm_sensors', _StationFrame._on_confirm_sensors)
+
+    def _switch_instrument(self, i):
+        # As PageStart: the frame of the previous instrument is dropped and a new one is built
+        frame = _TransectFrame() if i % 2 else _StationFrame()
+        events.post_event('select_instrument', 'SBE09')
+        events.post_event('confirm_sensors', None)
+        return frame
+
+    def test_switching_instruments_keeps_subscribers_and_memory_flat(self):
+        frame = self._switch_instrument(0)
+        frame = self._switch_instrument(1)
+        nr_subscribers = events.nr_subscribers('select_instrument')
+        self.assertEqual(nr_subscribers, 2)
+        old_frame = weakref.ref(frame)
+
+        tracemalloc.start()
+        try:
+            for i in range(100):
+                frame = self._switch_instrument(i)
+            gc.collect()
+            memory_before = tracemalloc.get_traced_memory()[0]
+            for i in range(500):
+                frame = self._switch_instrument(i)
+                self.assertLessEqual(events.nr_subscribers('select_instrument'), nr_subscribers)
+            gc.collect()
+            memory_after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        self.assertIsNone(old_frame())
+        self.assertEqual(events.nr_subscribers('select_instrument'), nr_subscribers)
+        self.assertEqual(frame.nr_calls, 3)
+        # Every leaked frame would hold at least 8 kB
+        self.assertLess(memory_after - memory_before, 50_000)
+
+    def test_dropped_frame_is_unsubscribed(self):
+        frame = _TransectFrame()
+        self.assertEqual(events.nr_subscribers('select_instrument'), 2)
+        del frame
+        gc.collect()
+        self.assertEqual(events.nr_subscribers('select_instrument'), 0)
+        # Dead subscriptions are not called
+        events.post_event('select_instrument', 'SBE09')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from sharktools_ctd_pre_system import saves
+
+
+class _Saves:
+    """
+    Headless stand-in for Saves. Only get and version are used by ResolvedSelections.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.version = 0
+
+    def get(self, key, default=''):
+        return self.data.get(key, default)
+
+
+class _Defaults:
+
+    def __init__(self, data):
+        self.data = data
+
+
+class TestResolveSelection(unittest.TestCase):
+
+    def test_default_has_precedence_over_saved_value(self):
+        resolved = saves.resolve_selection({'operator': 'AB', 'depth': '85'}, {'operator': 'XX'})
+        self.assertEqual(resolved['operator'], 'XX')
+        self.assertEqual(resolved['depth'], '85')
+
+    def test_none_is_skipped(self):
+        resolved = saves.resolve_selection({'operator': 'AB', 'depth': None}, {'operator': None})
+        self.assertEqual(resolved['operator'], 'AB')
+        self.assertNotIn('depth', resolved)
+
+    def test_resolved_selection_is_read_only(self):
+        resolved = saves.resolve_selection({'operator': 'AB'}, {})
+        with self.assertRaises(TypeError):
+            resolved['operator'] = 'XX'
+
+
+class TestResolvedSelections(unittest.TestCase):
+
+    def test_options_are_not_used_as_values(self):
+        # 'mprog' is a list of choices in options.yaml
+        selections = saves.ResolvedSelections(_Saves({'Frame': {'depth': '85'}}), _Defaults({'operator': 'XX'}))
+        self.assertIn('mprog', selections.options)
+        selection = selections.get('Frame')
+        self.assertEqual(dict(selection), {'depth': '85', 'operator': 'XX'})
+
+    def test_saved_value_that_is_not_a_dict_is_ignored(self):
+        selections = saves.ResolvedSelections(_Saves({'Frame': 'SBE09'}), _Defaults({'operator': 'XX'}))
+        self.assertEqual(dict(selections.get('Frame')), {'operator': 'XX'})
+
+    def test_outdated_when_saves_change(self):
+        store = _Saves({})
+        defaults = _Defaults({})
+        selections = saves.ResolvedSelections(store, defaults)
+        self.assertFalse(selections.is_outdated(store, defaults))
+        store.version += 1
+        self.assertTrue(selections.is_outdated(store, defaults))
+        self.assertTrue(selections.is_outdated(_Saves({}), defaults))
+
+
+class TestSavesDurability(unittest.TestCase):
+    """
+    Crash recovery and merging of changes from other processes (two Saves on the same file stand in for two
+    processes).
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file_path = pathlib.Path(self._directory.name, 'saves.json')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _open(self):
+        return saves.Saves(write_delay=0, file_path=self.file_path)
+
+    def test_instances_updating_different_components_of_a_key(self):
+        first = self._open()
+        second = self._open()
+        first.update('Frame', {'station': 'BY5'})
+        second.update('Frame', {'depth': '85'})
+        first.update('Frame', {'operator': 'XX'})
+        self.assertEqual(first.get('Frame'), {'station': 'BY5', 'depth': '85', 'operator': 'XX'})
+        self.assertEqual(self._open().get('Frame'), {'station': 'BY5', 'depth': '85', 'operator': 'XX'})
+
+    def test_set_replaces_components_written_by_another_instance(self):
+        first = self._open()
+        second = self._open()
+        first.update('Frame', {'station': 'BY5'})
+        second.set('Frame', {'depth': '85'})
+        self.assertEqual(self._open().get('Frame'), {'depth': '85'})
+
+    def test_compaction_by_another_instance(self):
+        first = self._open()
+        second = self._open()
+        first.update('Frame', {'station': 'BY5'})
+        with mock.patch.object(saves, 'COMPACT_AFTER', 3):
+            for i in range(5):
+                second.update('Frame', {'series': str(i).zfill(4)})
+            with open(second.log_path) as fid:
+                self.assertLess(len(fid.readlines()), 5)
+            first.update('Frame', {'depth': '85'})
+        expected = {'station': 'BY5', 'series': '0004', 'depth': '85'}
+        self.assertEqual(first.get('Frame'), expected)
+        self.assertEqual(self._open().get('Frame'), expected)
+
+    def test_truncated_last_record_is_ignored(self):
+        store = self._open()
+        store.set('FrameSelectInstrument', {'instrument': 'SBE09'})
+        store.update('Frame', {'station': 'BY5'})
+        # A crash while appending a record
+        with open(store.log_path, 'ab') as fid:
+            fid.write(b'{"k":"Frame","c":"depth","v":"8')
+        recovered = self._open()
+        self.assertEqual(recovered.get('Frame'), {'station': 'BY5'})
+        self.assertEqual(recovered.get('FrameSelectInstrument'), {'instrument': 'SBE09'})
+        # The store is written on from the recovered state
+        recovered.update('Frame', {'depth': '85'})
+        self.assertEqual(self._open().get('Frame'), {'station': 'BY5', 'depth': '85'})
+
+    def test_pending_changes_are_written_on_flush(self):
+        store = saves.Saves(write_delay=60, file_path=self.file_path)
+        store.update('Frame', {'station': 'BY5'})
+        self.assertTrue(store.dirty)
+        self.assertEqual(self._open().get('Frame', None), None)
+        store.flush()
+        self.assertFalse(store.dirty)
+        self.assertEqual(self._open().get('Frame'), {'station': 'BY5'})
+
+
+if __name__ == '__main__':
+    unittest.main()